@@ -0,0 +1,135 @@
+import os
+import time
+import threading
+from contextvars import ContextVar
+from typing import Optional, List, Dict, Any
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.modules.metrics import registry
+from utils.logging import logger
+
+# 是否输出每条 SQL（SQLAlchemy echo），生产环境应关闭
+DB_ECHO = os.getenv("DB_ECHO", "0") != "0"
+# 慢查询阈值（毫秒）
+DB_SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", "100"))
+# 同一请求中同一语句执行次数达到该值时视为 N+1 查询
+DB_N_PLUS_ONE_THRESHOLD = int(os.getenv("DB_N_PLUS_ONE_THRESHOLD", "10"))
+# 全局统计最多保留的不同语句数
+DB_STATEMENT_LIMIT = 500
+
+QUERY_DURATION = registry.histogram(
+    "db_query_duration_seconds", "SQL statement execution time",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+)
+SLOW_QUERIES = registry.counter("db_slow_queries_total", "SQL statements slower than DB_SLOW_QUERY_MS")
+N_PLUS_ONE = registry.counter("db_n_plus_one_total", "Requests that repeated one statement DB_N_PLUS_ONE_THRESHOLD times or more")
+
+class RequestStats:
+    """单个请求的数据库统计，通过 ContextVar 在同一请求的协程（以及 SQLAlchemy 的 greenlet）中共享"""
+
+    __slots__ = ("queries", "db_time", "statements")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.statements: Dict[str, int] = {}
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+def begin_request() -> Any:
+    """开始统计一个请求，返回用于 end_request 的令牌"""
+    return _current.set(RequestStats())
+
+def current_stats() -> Optional[RequestStats]:
+    """当前请求的统计信息，不在请求中时为 None"""
+    return _current.get()
+
+def end_request(token: Any, route: Optional[str] = None) -> RequestStats:
+    """结束统计，检查 N+1 查询，只输出汇总而不是每条语句"""
+    stats = _current.get() or RequestStats()
+    _current.reset(token)
+    repeated = [(count, sql) for sql, count in stats.statements.items() if count >= DB_N_PLUS_ONE_THRESHOLD]
+    if repeated:
+        N_PLUS_ONE.inc()
+        count, sql = max(repeated)
+        logger.warning("Possible N+1 query in %s: %d executions of %s", route, count, _shorten(sql))
+    return stats
+
+class StatementStats:
+    """按语句汇总的全局统计：次数、总耗时、最大耗时"""
+
+    def __init__(self, limit: int = DB_STATEMENT_LIMIT):
+        self.limit = limit
+        self._items: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, statement: str, elapsed: float):
+        with self._lock:
+            item = self._items.get(statement)
+            if item is None:
+                if len(self._items) >= self.limit:
+                    return
+                item = self._items[statement] = [0, 0.0, 0.0]
+            item[0] += 1
+            item[1] += elapsed
+            if elapsed > item[2]:
+                item[2] = elapsed
+
+    def top(self, count: int = 10) -> List[Dict[str, Any]]:
+        """按总耗时排序的前 count 条语句"""
+        with self._lock:
+            items = sorted(self._items.items(), key=lambda x: x[1][1], reverse=True)[:count]
+        return [
+            {"statement": _shorten(sql), "count": n, "total_ms": round(total * 1000, 3), "max_ms": round(peak * 1000, 3)}
+            for sql, (n, total, peak) in items
+        ]
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+statement_stats = StatementStats()
+
+def _shorten(statement: str, size: int = 200) -> str:
+    statement = " ".join(statement.split())
+    return statement if len(statement) <= size else statement[:size] + "..."
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("query_start")
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    QUERY_DURATION.observe(elapsed)
+    statement_stats.record(statement, elapsed)
+    stats = _current.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_time += elapsed
+        stats.statements[statement] = stats.statements.get(statement, 0) + 1
+    if elapsed * 1000 >= DB_SLOW_QUERY_MS:
+        SLOW_QUERIES.inc()
+        # 只记录语句与耗时，不记录参数
+        logger.warning("Slow query (%.1f ms): %s", elapsed * 1000, _shorten(statement))
+
+def _handle_error(context):
+    # 执行失败时不会触发 after_cursor_execute，丢弃对应的开始时间
+    conn = context.connection
+    if conn is not None:
+        starts = conn.info.get("query_start")
+        if starts:
+            starts.pop()
+
+def instrument(engine: Engine):
+    """为（同步）引擎注册语句计时事件，异步引擎传入 engine.sync_engine"""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+def log_summary(count: int = 10):
+    """输出耗时最多的语句汇总"""
+    for item in statement_stats.top(count):
+        logger.info("SQL summary: %(count)d x %(total_ms).1f ms total, %(max_ms).1f ms max: %(statement)s", item)
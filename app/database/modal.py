@@ -1,4 +1,5 @@
 from sqlmodel import SQLModel, Field, Relationship
+from sqlalchemy import Index
 from typing import Optional, List
 from datetime import datetime, timezone
 import enum
@@ -75,6 +76,12 @@ class Vocabulary(SQLModel, table=True):
 
 # 学习进度模型
 class LearningProgress(SQLModel, table=True):
+    __table_args__ = (
+        # 覆盖索引，学习统计聚合只需扫描索引
+        Index("ix_learningprogress_user_mastery", "user_id", "mastery_level"),
+        # 复习队列按到期时间做索引范围扫描
+        Index("ix_learningprogress_user_next_review", "user_id", "next_review"),
+    )
     user_id: int = Field(foreign_key="account.id", primary_key=True)
     vocab_id: int = Field(foreign_key="vocabulary.id", primary_key=True)
     mastery_level: MasteryLevel
@@ -83,6 +90,14 @@ class LearningProgress(SQLModel, table=True):
     user: Account = Relationship(back_populates="learning_progresses")
     vocabulary: Vocabulary = Relationship(back_populates="learning_progresses")
 
+# 学习统计计数模型（按用户增量维护）
+class LearningStats(SQLModel, table=True):
+    user_id: int = Field(foreign_key="account.id", primary_key=True)
+    total_vocab: int = 0
+    mastered_vocab: int = 0
+    practicing_vocab: int = 0
+    new_vocab: int = 0
+
 # 游戏会话模型
 class GameSession(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
@@ -1,18 +1,84 @@
 import os
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import AsyncSession, AsyncEngine, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from .modal import * # type: ignore # 仅导入模型，实际不使用
+from .instrumentation import instrument, DB_ECHO
 from pathlib import Path
 
+# SQLite 连接参数，每个新连接建立时通过 PRAGMA 应用
+DB_TUNED = os.getenv("DB_TUNED", "1") != "0"
+DB_JOURNAL_MODE = os.getenv("DB_JOURNAL_MODE", "WAL")  # WAL 下读写互不阻塞
+DB_SYNCHRONOUS = os.getenv("DB_SYNCHRONOUS", "NORMAL")  # WAL 下 NORMAL 不会损坏数据库，只可能丢失最后的事务
+DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))  # 遇到写锁时等待而不是立即报错
+DB_CACHE_SIZE_KB = int(os.getenv("DB_CACHE_SIZE_KB", "20000"))
+DB_MMAP_SIZE = int(os.getenv("DB_MMAP_SIZE", str(256 * 1024 * 1024)))
+
+def _apply_pragmas(dbapi_connection, readonly: bool):
+    cursor = dbapi_connection.cursor()
+    try:
+        # 日志模式与同步级别对只读连接无效（日志模式由可写连接持久设置）
+        if not readonly:
+            cursor.execute(f"PRAGMA journal_mode = {DB_JOURNAL_MODE}")
+            cursor.execute(f"PRAGMA synchronous = {DB_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA busy_timeout = {DB_BUSY_TIMEOUT_MS}")
+        cursor.execute(f"PRAGMA cache_size = {-DB_CACHE_SIZE_KB}")
+        cursor.execute(f"PRAGMA mmap_size = {DB_MMAP_SIZE}")
+        if readonly:
+            cursor.execute("PRAGMA query_only = ON")
+    finally:
+        cursor.close()
+
+def make_engine(path: Path, readonly: bool = False, tuned: bool = DB_TUNED) -> AsyncEngine:
+    """
+    创建 SQLite 异步引擎
+
+    :param path: 数据库文件路径
+    :param readonly: 以只读方式打开（mode=ro），用于只读查询
+    :param tuned: 是否在每个连接上应用 WAL、busy_timeout 等参数
+    """
+    if readonly:
+        url = f"sqlite+aiosqlite:///file:{path.as_posix()}?mode=ro&uri=true"
+    else:
+        url = f"sqlite+aiosqlite:///{path.as_posix()}"
+    result = create_async_engine(url, echo=DB_ECHO, future=True)
+    if tuned:
+        event.listen(result.sync_engine, "connect", lambda conn, record: _apply_pragmas(conn, readonly))
+    # 语句计时、慢查询与 N+1 检测，代替逐条 echo
+    instrument(result.sync_engine)
+    return result
+
+# 单条语句绑定变量数的保守上限（旧版 SQLite 默认 SQLITE_MAX_VARIABLE_NUMBER 为 999）
+SQLITE_MAX_VARIABLE = 900
+
 # 全局变量，方便其他模块使用
 db_path = Path(__file__).resolve().parent.parent.parent / "data" / "app.db"
 DATABASE_URL = f"sqlite+aiosqlite:///{db_path.as_posix()}"
-engine = create_async_engine(DATABASE_URL, echo=True, future=True)
+engine = make_engine(db_path)
 async_session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
-from sqlmodel import SQLModel
+# 只读引擎：GET 接口使用，与写连接分开，WAL 下读取不会被写事务阻塞
+read_engine = make_engine(db_path, readonly=True)
+read_session = sessionmaker(read_engine, class_=AsyncSession, expire_on_commit=False)
+
+from app.modules.metrics import registry, gauge_family
+
+# 连接池状态，在导出指标时读取
+def _pool_metrics():
+    values = []
+    for label, item in (("write", engine), ("read", read_engine)):
+        pool = item.sync_engine.pool
+        for name, attr in (("size", "size"), ("checked_in", "checkedin"), ("checked_out", "checkedout"), ("overflow", "overflow")):
+            func = getattr(pool, attr, None)
+            if func is not None:
+                values.append(({"engine": label, "state": name}, func()))
+    return [gauge_family("db_pool_connections", "SQLAlchemy connection pool state", values)]
+
+registry.collector("db_pool", _pool_metrics)
+
+from sqlmodel import SQLModel, select
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import Optional, List, Type, TypeVar
+from typing import Optional, List, Type, TypeVar, Sequence, Any
 
 # 通用类型变量，方便通用读取函数
 T = TypeVar("T", bound=SQLModel)
@@ -21,6 +87,13 @@ T = TypeVar("T", bound=SQLModel)
 async def init_db():
     async with engine.begin() as conn:
         await conn.run_sync(SQLModel.metadata.create_all)
+        # create_all 不会为已存在的表补建索引，这里单独补齐
+        await conn.run_sync(_create_missing_indexes)
+
+def _create_missing_indexes(conn):
+    for table in SQLModel.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
 
 # 创建对象，写入数据库
 async def create_entity(session: AsyncSession, entity: T) -> T:
@@ -29,6 +102,11 @@ async def create_entity(session: AsyncSession, entity: T) -> T:
     await session.refresh(entity)  # 刷新得到数据库最新状态（比如自增id）
     return entity
 
+# 以 BEGIN IMMEDIATE 开始写事务：先取得写锁再读取，读-改-写期间不会有其它写事务插入
+# 必须是会话中的第一条语句（驱动只在 INSERT/UPDATE/DELETE 前隐式开始事务，普通查询不在事务中）
+async def begin_write(session: AsyncSession):
+    await session.execute(text("BEGIN IMMEDIATE"))
+
 # 根据主键读取单个对象
 async def get_entity_by_id(session: AsyncSession, model: Type[T], id: int) -> Optional[T]:
     result = await session.get(model, id)
@@ -41,6 +119,14 @@ async def get_entities(session: AsyncSession, model: Type[T], offset: int = 0, l
     )
     return q.scalars().all() #type: ignore
 
+# 按主键游标分页，只读取指定列（keyset 分页，避免 offset 扫描）
+async def get_columns_after(session: AsyncSession, model: Type[T], columns: Sequence[Any], after_id: Optional[int] = None, limit: int = 100) -> List[Any]:
+    stmt = select(*columns).order_by(model.id).limit(limit) #type: ignore
+    if after_id is not None:
+        stmt = stmt.where(model.id > after_id) #type: ignore
+    q = await session.execute(stmt)
+    return q.all() #type: ignore
+
 # 更新某个对象的指定字段
 async def update_entity(session: AsyncSession, model: Type[T], id: int, **fields) -> Optional[T]: #type: ignore
     obj = await get_entity_by_id(session, model, id)
@@ -60,3 +146,56 @@ async def delete_entity(session: AsyncSession, model: Type[T], id: int) -> bool:
     await session.delete(obj)
     await session.commit()
     return True
+
+if __name__ == "__main__":
+    # 并发读写吞吐对比：python -m app.database.sql [秒数]
+    import sys
+    import time
+    import asyncio
+    import tempfile
+    from sqlalchemy import text
+    from sqlalchemy.exc import OperationalError
+
+    async def bench(tuned: bool, seconds: float, writers: int = 4, readers: int = 8):
+        path = Path(tempfile.mkdtemp()) / "bench.db"
+        write_engine = make_engine(path, tuned=tuned)
+        async with write_engine.begin() as conn:
+            await conn.execute(text("CREATE TABLE progress (id INTEGER PRIMARY KEY, user_id INTEGER, level INTEGER)"))
+            await conn.execute(text("CREATE INDEX ix_progress_user ON progress (user_id)"))
+        # 未调优时读写共用同一个引擎，与调优前的部署方式一致
+        query_engine = make_engine(path, readonly=True, tuned=tuned) if tuned else write_engine
+        counts = {"writes": 0, "reads": 0, "errors": 0}
+        deadline = time.perf_counter() + seconds
+
+        async def writer(n: int):
+            i = 0
+            while time.perf_counter() < deadline:
+                i += 1
+                try:
+                    async with write_engine.begin() as conn:
+                        await conn.execute(text("INSERT INTO progress (user_id, level) VALUES (:u, :l)"), {"u": (n * 7919 + i) % 100, "l": i % 10})
+                    counts["writes"] += 1
+                except OperationalError:
+                    counts["errors"] += 1
+
+        async def reader(n: int):
+            i = 0
+            while time.perf_counter() < deadline:
+                i += 1
+                try:
+                    async with query_engine.connect() as conn:
+                        await conn.execute(text("SELECT count(*), sum(level) FROM progress WHERE user_id = :u"), {"u": (n + i) % 100})
+                    counts["reads"] += 1
+                except OperationalError:
+                    counts["errors"] += 1
+
+        await asyncio.gather(*[writer(n) for n in range(writers)], *[reader(n) for n in range(readers)])
+        await write_engine.dispose()
+        if query_engine is not write_engine:
+            await query_engine.dispose()
+        return {name: value / seconds if name != "errors" else value for name, value in counts.items()}
+
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 5
+    for tuned in (False, True):
+        result = asyncio.run(bench(tuned, seconds))
+        print(("tuned  " if tuned else "default") + "  writes/s=%(writes).0f  reads/s=%(reads).0f  errors=%(errors)d" % result)
@@ -0,0 +1,90 @@
+import os
+import json
+import time
+from typing import Optional, Dict, Any
+
+from app.database.instrumentation import begin_request, end_request
+from app.modules.metrics import registry
+from utils.logging import access_logger
+
+# 是否输出每个请求的耗时日志
+REQUEST_LOG = os.getenv("REQUEST_LOG", "1") != "0"
+
+REQUEST_LATENCY = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency by router", ("router", "method", "status")
+)
+REQUEST_QUERIES = registry.counter(
+    "http_request_db_queries_total", "Database queries issued while serving requests", ("router",)
+)
+
+class JsonLine:
+    """延迟序列化：只有日志级别启用、真正格式化时才转换为 JSON"""
+
+    __slots__ = ("fields",)
+
+    def __init__(self, fields: Dict[str, Any]):
+        self.fields = fields
+
+    def __str__(self) -> str:
+        return json.dumps(self.fields, ensure_ascii=False, separators=(",", ":"))
+
+def route_template(scope) -> Optional[str]:
+    """路由模板（如 /api/group/{group_id}/members），未匹配到路由时为 None"""
+    route = scope.get("route")
+    return getattr(route, "path", None)
+
+def router_name(scope) -> str:
+    """路由所属的路由模块（app.routes.User -> User），未匹配到路由时为 unmatched"""
+    endpoint = scope.get("endpoint")
+    module = getattr(endpoint, "__module__", None)
+    if not module:
+        return "unmatched"
+    return module.rsplit(".", 1)[-1]
+
+class TimingMiddleware:
+    """
+    请求计时中间件（纯 ASGI），记录方法、路由模板、状态码、数据库查询次数、耗时与 CPU 时间，
+    同时按路由模块汇总到延迟直方图
+
+    CPU 时间为请求期间事件循环线程的 CPU 时间，并发请求交替执行时会互相计入，仅供参考
+    """
+
+    def __init__(self, app, log: bool = REQUEST_LOG):
+        self.app = app
+        self.log = log
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = begin_request()
+        status_code = 500
+        wall = time.perf_counter()
+        cpu = time.thread_time()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            wall = time.perf_counter() - wall
+            cpu = time.thread_time() - cpu
+            stats = end_request(token, route_template(scope))
+            router = router_name(scope)
+            REQUEST_LATENCY.observe(wall, router=router, method=scope["method"], status=status_code)
+            if stats.queries:
+                REQUEST_QUERIES.inc(stats.queries, router=router)
+            if self.log:
+                access_logger.info("%s", JsonLine({
+                    "method": scope["method"],
+                    "route": route_template(scope),
+                    "status": status_code,
+                    "queries": stats.queries,
+                    "db_ms": round(stats.db_time * 1000, 3),
+                    "wall_ms": round(wall * 1000, 3),
+                    "cpu_ms": round(cpu * 1000, 3)
+                }))
@@ -0,0 +1,131 @@
+import os
+import time
+import hashlib
+from collections import OrderedDict
+from typing import Optional, Dict, NamedTuple, Set
+from dotenv import load_dotenv
+
+from app.modules.metrics import registry, cache_families
+
+load_dotenv()  # 加载 .env 文件
+
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "4096"))
+TOKEN_CACHE_TTL = float(os.getenv("TOKEN_CACHE_TTL", "300"))  # 秒
+
+# 已验证的用户身份，挂在 request.state.user 上供路由使用
+class Principal(NamedTuple):
+    user_id: int
+    role: int
+    username: str
+    token: str
+
+    @property
+    def id(self) -> int:
+        return self.user_id
+
+class TokenCache:
+    """
+    令牌验证缓存，以令牌摘要为键，按 LRU 淘汰并带有 TTL
+
+    每个用户有一个代数，invalidate_user 时加一；验证方在读数据库前取得代数并随 put 传入，
+    读取期间用户被失效（重新登录、角色变更、删除）时，put 会丢弃这份已过时的身份
+    """
+
+    def __init__(self, max_size: int = TOKEN_CACHE_SIZE, ttl: float = TOKEN_CACHE_TTL):
+        """
+        初始化令牌缓存
+
+        :param max_size: 最大缓存条目数，0 表示禁用缓存
+        :param ttl: 条目存活时间（秒）
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, tuple[float, Principal]]" = OrderedDict()
+        self._by_user: Dict[int, Set[str]] = {}
+        self._generations: Dict[int, int] = {}
+
+    @staticmethod
+    def digest(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, token: str) -> Optional[Principal]:
+        """查询缓存，过期条目视为未命中"""
+        key = self.digest(token)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires, principal = entry
+        if expires <= time.monotonic() or principal.token != token:
+            self._discard(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return principal
+
+    def generation(self, user_id: int) -> int:
+        """用户当前的代数，在读取数据库之前获取"""
+        return self._generations.get(user_id, 0)
+
+    def put(self, principal: Principal, exp: Optional[float] = None, generation: Optional[int] = None):
+        """
+        写入缓存
+
+        :param principal: 已验证的用户身份
+        :param exp: 令牌过期时间戳（JWT 的 exp），缓存条目不会比令牌活得更久
+        :param generation: 读取数据库前取得的代数，与当前代数不一致时不写入
+        """
+        if self.max_size <= 0:
+            return
+        if generation is not None and generation != self.generation(principal.user_id):
+            return
+        ttl = self.ttl
+        if exp is not None:
+            ttl = min(ttl, exp - time.time())
+        if ttl <= 0:
+            return
+        key = self.digest(principal.token)
+        self._discard(key)
+        self._entries[key] = (time.monotonic() + ttl, principal)
+        self._by_user.setdefault(principal.user_id, set()).add(key)
+        while len(self._entries) > self.max_size:
+            oldest = next(iter(self._entries))
+            self._discard(oldest)
+
+    def invalidate_user(self, user_id: int):
+        """使某个用户的全部缓存令牌失效（例如重新登录签发了新令牌），并使进行中的验证结果作废"""
+        self._generations[user_id] = self._generations.get(user_id, 0) + 1
+        for key in self._by_user.pop(user_id, set()):
+            self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+        self._by_user.clear()
+
+    def stats(self) -> Dict[str, float]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0
+        }
+
+    def _discard(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        keys = self._by_user.get(entry[1].user_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_user[entry[1].user_id]
+
+# 全局令牌缓存实例
+token_cache = TokenCache()
+
+registry.collector("auth_token_cache", lambda: cache_families("auth_token_cache", token_cache.stats()))
@@ -1,8 +1,11 @@
 from fastapi import Request, HTTPException, status
 from functools import wraps
-from app.database.sql import async_session, get_entity_by_id
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from app.database.sql import read_session, get_entity_by_id
 from app.database.modal import Account, UserRoles
 from app.middlewares.jwt import JWTAuth
+from app.middlewares.token_cache import token_cache, Principal
 
 def RequireRole(min_role: UserRoles):
     def decorator(func):
@@ -28,14 +31,47 @@ def RequireRole(min_role: UserRoles):
             user_id = payload.get("user_id")
             if not user_id:
                 raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="JWT缺少用户ID")
-            async with async_session() as session:
-                user = await get_entity_by_id(session, Account, user_id)
-                if not user:
-                    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="用户不存在")
-                if user.jwt != token:
-                    raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="JWT不匹配")
-                if user.role < min_role:
-                    raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="权限不足")
+            principal = token_cache.get(token)
+            if principal is None:
+                # 先取得代数再读数据库，读取期间用户被失效时不会缓存过时的身份
+                generation = token_cache.generation(user_id)
+                async with read_session() as session:
+                    user = await get_entity_by_id(session, Account, user_id)
+                    if not user:
+                        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="用户不存在")
+                    if user.jwt != token:
+                        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="JWT不匹配")
+                    principal = Principal(user_id=user.id, role=user.role, username=user.username, token=token)
+                # 缓存已验证的身份，后续请求无需再访问数据库
+                token_cache.put(principal, payload.get("exp"), generation)
+            if principal.role < min_role:
+                raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="权限不足")
+            request.state.user = principal
             return await func(*args, request=request, **kwargs)
         return wrapper
-    return decorator
\ No newline at end of file
+    return decorator
+
+# 令牌、角色变更或账号删除后使缓存失效：刷新时记录受影响的用户，提交后再失效，
+# 提交前读到旧数据的验证请求因代数变化而无法写入缓存
+_ACCOUNT_AUTH_FIELDS = ("jwt", "role")
+
+@event.listens_for(Session, "after_flush")
+def _collect_account_changes(session, flush_context):
+    changed = session.info.setdefault("token_cache_users", set())
+    for obj in session.deleted:
+        if isinstance(obj, Account):
+            changed.add(obj.id)
+    for obj in session.dirty:
+        if isinstance(obj, Account):
+            attrs = inspect(obj).attrs
+            if any(attrs[name].history.has_changes() for name in _ACCOUNT_AUTH_FIELDS):
+                changed.add(obj.id)
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_account_changes(session):
+    for user_id in session.info.pop("token_cache_users", ()):
+        token_cache.invalidate_user(user_id)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_account_changes(session):
+    session.info.pop("token_cache_users", None)
@@ -0,0 +1,161 @@
+import os
+import threading
+from pathlib import Path
+from typing import Optional, List, Dict, Any, Sequence, Union
+import anyio
+from anyio.to_thread import run_sync
+
+from app.modules.stardict import StarDict, StarDictPool, LemmaDB, PROFILE_SERVER, set_journal_mode
+from app.modules.spelling import SpellingIndex, open_spelling_index, dictionary_stamp
+from app.modules.lookup import open_lemma, lookup_tokens, lookup_text
+from app.modules.metrics import registry, cache_families
+from utils.logging import logger
+
+DICT_PATH = os.getenv("DICT_PATH", str(Path(__file__).resolve().parent.parent.parent / "data" / "stardict.db"))
+DICT_POOL_SIZE = int(os.getenv("DICT_POOL_SIZE", "4"))
+DICT_CACHE_SIZE = int(os.getenv("DICT_CACHE_SIZE", "8192"))
+# 缓存条目的存活时间（秒），词典文件被其它进程改写时连接池也会按文件标识清空缓存
+DICT_CACHE_TTL = float(os.getenv("DICT_CACHE_TTL", "300"))
+# 启动时确保全文索引存在，首次建立需要写词典文件且耗时较长，默认关闭，
+# 建议预先执行 python -m app.modules.dictionary fts 建立
+DICT_FTS = os.getenv("DICT_FTS", "0") != "0"
+DICT_SPELLING = os.getenv("DICT_SPELLING", "1") != "0"  # 提供拼写建议（首次请求时加载纠错索引）
+LEMMA_PATH = os.getenv("LEMMA_PATH", str(Path(DICT_PATH).parent / "lemma.en.txt"))
+
+DICT_LOOKUPS = registry.counter("dictionary_lookups_total", "Dictionary operations by kind", ("op",))
+
+class DictionaryService:
+    """
+    异步词典服务，把同步的 StarDict 查询放到线程池中执行，避免阻塞事件循环
+    """
+
+    def __init__(
+        self,
+        pool: StarDictPool,
+        spelling: Optional[SpellingIndex] = None,
+        lemma: Optional[LemmaDB] = None,
+        spelling_source: Optional[str] = None
+    ):
+        """
+        :param pool: 只读连接池，工作线程数与连接数一致
+        :param spelling: 拼写纠错索引，为 None 时按 spelling_source 在首次拼写建议时加载
+        :param lemma: 词形数据，为 None 时批量查询只依赖词条的 exchange 字段
+        :param spelling_source: 词典文件路径，纠错索引保存在它旁边；均为 None 时不提供拼写建议
+        """
+        self.pool = pool
+        self.spelling = spelling
+        self.spelling_source = spelling_source
+        self._spelling_lock = threading.Lock()
+        self.lemma = lemma
+        self.fts = pool.fts_enabled()
+        self._limiter = anyio.CapacityLimiter(pool.size())
+        registry.collector("dictionary_cache", lambda: cache_families("dictionary_cache", self.pool.cache_stats()))
+
+    @classmethod
+    def open(cls, path: str = DICT_PATH, pool_size: int = DICT_POOL_SIZE) -> Optional["DictionaryService"]:
+        """打开词典文件，文件不存在时返回 None"""
+        if not os.path.exists(path):
+            logger.warning("词典文件不存在，词典接口不可用: %s", path)
+            return None
+        if DICT_FTS:
+            build_fts(path)
+        pool = StarDictPool(path, pool_size, PROFILE_SERVER, DICT_CACHE_SIZE, DICT_CACHE_TTL)
+        logger.info("词典已加载: %s（%d 个连接）", path, pool_size)
+        journal = pool.journal_mode()
+        if journal.lower() != PROFILE_SERVER["journal_mode"].lower():
+            # 启动时不修改词典文件，只提示离线切换
+            logger.warning(
+                "词典文件的日志模式为 %s，建议执行 python -m app.modules.dictionary wal 切换为 %s",
+                journal, PROFILE_SERVER["journal_mode"]
+            )
+        return cls(pool, None, open_lemma(LEMMA_PATH), path if DICT_SPELLING else None)
+
+    async def _run(self, func, *args):
+        DICT_LOOKUPS.inc(op=func.__name__)
+        return await run_sync(func, *args, limiter=self._limiter)
+
+    async def query(self, key: Union[int, str]) -> Optional[Dict[str, Any]]:
+        return await self._run(self.pool.query, key)
+
+    async def match(self, word: str, limit: int = 10, strip: bool = False) -> List[tuple]:
+        return await self._run(self.pool.match, word, limit, strip)
+
+    async def complete(self, prefix: str, limit: int = 10) -> List[tuple]:
+        return await self._run(self.pool.complete, prefix, limit)
+
+    async def search(self, text: str, limit: int = 10, field: Optional[str] = None) -> List[Dict[str, Any]]:
+        return await self._run(self.pool.search, text, limit, field)
+
+    def _load_spelling(self) -> Optional[SpellingIndex]:
+        """
+        加载（必要时建立）纠错索引，在工作线程中执行；
+        其它线程正在建立时不等待，直接返回 None，避免占满词典线程
+        """
+        if not self._spelling_lock.acquire(blocking=False):
+            return None
+        try:
+            if self.spelling is None:
+                path = self.spelling_source
+                stamp = dictionary_stamp(path, self.pool.count())
+                self.spelling = open_spelling_index(path, self.pool.ranks, stamp)
+            return self.spelling
+        finally:
+            self._spelling_lock.release()
+
+    def _suggest(self, word: str, limit: int, max_distance: Optional[int]) -> List[tuple]:
+        spelling = self.spelling
+        if spelling is None:
+            if self.spelling_source is None:
+                return []
+            spelling = self._load_spelling()
+            if spelling is None:
+                return []
+        return spelling.lookup(word, limit, max_distance)
+
+    async def suggest(self, word: str, limit: int = 5, max_distance: Optional[int] = None) -> List[tuple]:
+        # 首次调用需要加载或建立纠错索引，与其它查询一样放到线程池中执行
+        DICT_LOOKUPS.inc(op="suggest")
+        return await run_sync(self._suggest, word, limit, max_distance, limiter=self._limiter)
+
+    async def batch(self, keys: Sequence[Union[int, str]]) -> List[Optional[Dict[str, Any]]]:
+        return list(await self._run(self.pool.query_batch, list(keys)))
+
+    async def lookup_text(self, text: str):
+        """切分文本、还原词形并批量查询，返回 ([(单词, 原型)], {原型: 词条})"""
+        return await self._run(lookup_text, self.pool, self.lemma, text)
+
+    async def lookup_tokens(self, tokens: Sequence[str]):
+        return await self._run(lookup_tokens, self.pool, self.lemma, list(tokens))
+
+    def close(self):
+        registry.unregister_collector("dictionary_cache")
+        self.pool.close()
+
+def build_fts(path: str = DICT_PATH):
+    """用可写连接建立全文索引（连接池为只读），已建立时直接返回"""
+    sd = StarDict(path)
+    try:
+        if not sd.fts_enabled():
+            logger.info("正在建立全文索引: %s", path)
+            sd.enable_fts()
+            logger.info("全文索引建立完成: %s", path)
+    finally:
+        sd.close()
+
+if __name__ == "__main__":
+    # 离线维护词典文件：
+    #   python -m app.modules.dictionary fts [词典路径]   建立全文索引
+    #   python -m app.modules.dictionary wal [词典路径]   切换为 WAL 日志模式
+    import sys
+    path = sys.argv[2] if len(sys.argv) > 2 else DICT_PATH
+    if sys.argv[1:2] == ["fts"]:
+        build_fts(path)
+    elif sys.argv[1:2] == ["wal"]:
+        try:
+            mode = set_journal_mode(path, PROFILE_SERVER["journal_mode"])
+        except Exception as e:
+            logger.error("日志模式切换失败: %s: %s", path, e)
+            sys.exit(1)
+        logger.info("日志模式已切换: %s -> %s", path, mode)
+    else:
+        print("usage: python -m app.modules.dictionary fts|wal [path]")
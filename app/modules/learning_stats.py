@@ -0,0 +1,96 @@
+import os
+from typing import Optional, Dict, Iterable, Tuple
+from sqlalchemy import func, case
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import select
+
+from app.database.modal import LearningProgress, LearningStats, MasteryLevel
+
+# 掌握程度分段：>= 8 已掌握，4 ~ 7 练习中，< 4 新词
+MASTERED_THRESHOLD = 8
+PRACTICING_THRESHOLD = 4
+
+# 枚举在数据库中以名称存储，按分段预先划分成员，SQL 端用 IN 判断
+MASTERED_LEVELS = [m for m in MasteryLevel if m >= MASTERED_THRESHOLD]
+PRACTICING_LEVELS = [m for m in MasteryLevel if PRACTICING_THRESHOLD <= m < MASTERED_THRESHOLD]
+NEW_LEVELS = [m for m in MasteryLevel if m < PRACTICING_THRESHOLD]
+
+# 是否启用按用户增量维护的统计计数表
+STATS_COUNTERS_ENABLED = os.getenv("LEARNING_STATS_COUNTERS", "1") != "0"
+
+# 根据掌握程度返回所属分段
+def mastery_bucket(level: int) -> str:
+    if level >= MASTERED_THRESHOLD:
+        return "mastered_vocab"
+    if level >= PRACTICING_THRESHOLD:
+        return "practicing_vocab"
+    return "new_vocab"
+
+# 单条分组查询在数据库端完成分段计数
+async def aggregate_stats(session: AsyncSession, user_id: int) -> Dict[str, int]:
+    level = LearningProgress.mastery_level
+    stmt = select(
+        func.count(),
+        func.count(case((level.in_(MASTERED_LEVELS), 1))), #type: ignore
+        func.count(case((level.in_(PRACTICING_LEVELS), 1))), #type: ignore
+        func.count(case((level.in_(NEW_LEVELS), 1))), #type: ignore
+    ).where(LearningProgress.user_id == user_id)
+    total, mastered, practicing, new = (await session.execute(stmt)).one()
+    return {
+        "total_vocab": total,
+        "mastered_vocab": mastered,
+        "practicing_vocab": practicing,
+        "new_vocab": new
+    }
+
+# 读取学习统计，优先使用计数表（O(1)），不存在时回退到聚合查询
+async def get_stats(session: AsyncSession, user_id: int) -> Dict[str, int]:
+    if STATS_COUNTERS_ENABLED:
+        row = await session.get(LearningStats, user_id)
+        if row is not None:
+            return {
+                "total_vocab": row.total_vocab,
+                "mastered_vocab": row.mastered_vocab,
+                "practicing_vocab": row.practicing_vocab,
+                "new_vocab": row.new_vocab
+            }
+    return await aggregate_stats(session, user_id)
+
+# 在同一事务中根据掌握程度的变化 (旧值, 新值) 更新计数表，旧值为 None 表示新增
+# 调用方须用 begin_write 开始事务，并在事务内读取旧值，否则并发写入之间的增量会算错
+async def update_counters(session: AsyncSession, user_id: int, changes: Iterable[Tuple[Optional[int], int]]):
+    if not STATS_COUNTERS_ENABLED:
+        return
+    exists = (await session.execute(
+        select(LearningStats.user_id).where(LearningStats.user_id == user_id)
+    )).first()
+    if exists is None:
+        # 首次写入时用聚合结果初始化，此时本次变更已经刷入会话，无需再叠加增量；
+        # 已有计数行时同样以聚合结果为准，而不是丢弃本次变更
+        await session.flush()
+        stats = await aggregate_stats(session, user_id)
+        stmt = sqlite_insert(LearningStats).values(user_id=user_id, **stats)
+        await session.execute(stmt.on_conflict_do_update(
+            index_elements=[LearningStats.user_id],
+            set_={name: getattr(stmt.excluded, name) for name in stats}
+        ))
+        return
+    delta = {"total_vocab": 0, "mastered_vocab": 0, "practicing_vocab": 0, "new_vocab": 0}
+    for old_level, new_level in changes:
+        if old_level is None:
+            delta["total_vocab"] += 1
+        else:
+            delta[mastery_bucket(old_level)] -= 1
+        delta[mastery_bucket(new_level)] += 1
+    if not any(delta.values()):
+        return
+    # 使用 SQL 自增（col = col + excluded.col），不在应用中读-改-写
+    stmt = sqlite_insert(LearningStats).values(user_id=user_id, **delta)
+    await session.execute(stmt.on_conflict_do_update(
+        index_elements=[LearningStats.user_id],
+        set_={
+            name: getattr(LearningStats, name) + getattr(stmt.excluded, name)
+            for name, amount in delta.items() if amount
+        }
+    ))
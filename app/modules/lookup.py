@@ -0,0 +1,105 @@
+import os
+import re
+from typing import Optional, List, Dict, Any, Iterable, Tuple
+
+from app.modules.stardict import LemmaDB, StarDictPool, tools
+from utils.logging import logger
+
+# 英文单词：字母开头，允许内部的撇号与连字符（don't, well-known）
+TOKEN_PATTERN = re.compile(r"[A-Za-z]+(?:['’\-][A-Za-z]+)*")
+
+def tokenize(text: str) -> List[str]:
+    """把文本切分为英文单词序列"""
+    return [token.replace("’", "'") for token in TOKEN_PATTERN.findall(text)]
+
+def open_lemma(path: str) -> Optional[LemmaDB]:
+    """
+    加载词形数据，优先读取预编译索引（path + ".idx"），不存在或比文本旧时从文本重建
+
+    :param path: lemma 文本文件路径（每行：词根 -> 衍生1,衍生2）
+    """
+    index = path + ".idx"
+    lemma = LemmaDB()
+    try:
+        if os.path.exists(index) and (not os.path.exists(path) or os.path.getmtime(index) >= os.path.getmtime(path)):
+            lemma.load_index(index)
+            logger.info("词形索引已加载: %s（%d 个词根）", index, len(lemma))
+            return lemma
+    except (OSError, ValueError) as e:
+        logger.warning("词形索引无法读取，将从文本重建: %s", e)
+        lemma = LemmaDB()
+    if not os.path.exists(path):
+        logger.warning("词形文件不存在，批量查询不做词形还原: %s", path)
+        return None
+    lemma.load(path)
+    try:
+        lemma.save_index(index)
+    except OSError as e:
+        logger.warning("词形索引保存失败: %s", e)
+    logger.info("词形数据已加载: %s（%d 个词根）", path, len(lemma))
+    return lemma
+
+def _exchange_base(entry: Optional[Dict[str, Any]]) -> Optional[str]:
+    """词条 exchange 字段中的原型（0:原型），如 gave -> give"""
+    if not entry:
+        return None
+    exchange = tools.exchange_loads(entry.get("exchange"))
+    if not exchange:
+        return None
+    base = exchange.get("0")
+    if not base or base.lower() == entry["word"].lower():
+        return None
+    return base
+
+def lookup_tokens(
+    pool: StarDictPool,
+    lemma: Optional[LemmaDB],
+    tokens: Iterable[str]
+) -> Tuple[List[Tuple[str, Optional[str]]], Dict[str, Dict[str, Any]]]:
+    """
+    批量查询一组单词，并还原为词典中的原型
+
+    同一单词（忽略大小写）只查一次；原词与 LemmaDB 给出的词根合并为一次批量查询，
+    原词词条的 exchange 中给出的原型如未查到，再补一次批量查询
+
+    :return: ([(单词, 原型)], {原型: 词条})，未收录的单词原型为 None
+    """
+    tokens = list(tokens)
+    words = list(dict.fromkeys(token.lower() for token in tokens))
+    stems = lemma.lemmatize(words) if lemma is not None else words
+    keys = list(dict.fromkeys(words + stems))
+    found: Dict[str, Dict[str, Any]] = {}
+    for key, entry in zip(keys, pool.query_batch(keys)):
+        if entry is not None:
+            found[key] = entry
+    # 第二轮：exchange 原型
+    bases = {}
+    for word in words:
+        base = _exchange_base(found.get(word))
+        if base is not None:
+            bases[word] = base.lower()
+    missing = [base for base in dict.fromkeys(bases.values()) if base not in found]
+    if missing:
+        for key, entry in zip(missing, pool.query_batch(missing)):
+            if entry is not None:
+                found[key] = entry
+    # 原型优先级：exchange 原型 > LemmaDB 词根 > 原词
+    resolved: Dict[str, Optional[str]] = {}
+    for word, stem in zip(words, stems):
+        for key in (bases.get(word), stem, word):
+            if key is not None and key in found:
+                resolved[word] = found[key]["word"]
+                break
+        else:
+            resolved[word] = None
+    used = set(resolved.values())
+    entries = {entry["word"]: entry for entry in found.values() if entry["word"] in used}
+    return [(token, resolved[token.lower()]) for token in tokens], entries
+
+def lookup_text(
+    pool: StarDictPool,
+    lemma: Optional[LemmaDB],
+    text: str
+) -> Tuple[List[Tuple[str, Optional[str]]], Dict[str, Dict[str, Any]]]:
+    """切分文本并批量查询，见 lookup_tokens"""
+    return lookup_tokens(pool, lemma, tokenize(text))
@@ -0,0 +1,207 @@
+import math
+import threading
+from abc import ABC, abstractmethod
+from typing import Optional, List, Dict, Tuple, Callable, Iterable, Sequence
+
+# 一组样本：(指标名, 标签, 数值)
+Sample = Tuple[str, Dict[str, str], float]
+# 收集器返回的指标：(指标名, 类型, 说明, 样本)
+Family = Tuple[str, str, str, List[Sample]]
+
+# 默认的延迟直方图分桶（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+def _format_sample(name: str, labels: Dict[str, str], value: float) -> str:
+    if labels:
+        text = ",".join(f'{k}="{_escape(str(v))}"' for k, v in labels.items())
+        return f"{name}{{{text}}} {_format_value(value)}"
+    return f"{name} {_format_value(value)}"
+
+class Metric(ABC):
+    """指标基类，按标签值保存各个序列"""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key: Tuple[str, ...]) -> Dict[str, str]:
+        return dict(zip(self.labelnames, key))
+
+    @abstractmethod
+    def samples(self) -> List[Sample]:
+        """导出当前的全部样本"""
+
+class Counter(Metric):
+    """只增不减的计数器"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> List[Sample]:
+        with self._lock:
+            return [(self.name, self._labels(key), value) for key, value in self._values.items()]
+
+class Gauge(Metric):
+    """可增可减的瞬时值"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def samples(self) -> List[Sample]:
+        with self._lock:
+            return [(self.name, self._labels(key), value) for key, value in self._values.items()]
+
+class Histogram(Metric):
+    """累积分桶直方图"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # 标签 -> [各分桶计数..., 总和, 总数]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            data = self._values.get(key)
+            if data is None:
+                data = self._values[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    data[i] += 1
+            data[-2] += value
+            data[-1] += 1
+
+    def samples(self) -> List[Sample]:
+        result: List[Sample] = []
+        with self._lock:
+            items = [(key, list(data)) for key, data in self._values.items()]
+        for key, data in items:
+            labels = self._labels(key)
+            for bound, count in zip(self.buckets, data):
+                result.append((self.name + "_bucket", {**labels, "le": _format_value(bound)}, count))
+            result.append((self.name + "_bucket", {**labels, "le": "+Inf"}, data[-1]))
+            result.append((self.name + "_sum", labels, data[-2]))
+            result.append((self.name + "_count", labels, data[-1]))
+        return result
+
+class MetricsRegistry:
+    """
+    指标注册表，各子系统通过 counter/gauge/histogram 注册指标，
+    或通过 collector 注册在导出时才读取数值的回调
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._collectors: Dict[str, Callable[[], Iterable[Family]]] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name: str, help: str, labelnames: Sequence[str], **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help, labelnames, **kwargs)
+            elif not isinstance(metric, cls) or metric.labelnames != tuple(labelnames):
+                raise ValueError(f"metric {name} already registered with a different type or labels")
+            return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter, name, help, labelnames)
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge, name, help, labelnames)
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram, name, help, labelnames, buckets=buckets)
+
+    def collector(self, key: str, func: Callable[[], Iterable[Family]]):
+        """注册（或替换）收集回调，key 相同的回调只保留最后一个"""
+        with self._lock:
+            self._collectors[key] = func
+
+    def unregister_collector(self, key: str):
+        with self._lock:
+            self._collectors.pop(key, None)
+
+    def render(self) -> str:
+        """导出为 Prometheus 文本格式"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors.values())
+        families: List[Family] = [(m.name, m.kind, m.help, m.samples()) for m in metrics]
+        for func in collectors:
+            families.extend(func())
+        lines: List[str] = []
+        for name, kind, help, samples in families:
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for sample_name, labels, value in samples:
+                lines.append(_format_sample(sample_name, labels, value))
+        return "\n".join(lines) + "\n"
+
+# 全局指标注册表
+registry = MetricsRegistry()
+
+def gauge_family(name: str, help: str, samples: List[Tuple[Dict[str, str], float]]) -> Family:
+    """收集回调中构造一组 gauge 样本"""
+    return (name, "gauge", help, [(name, labels, value) for labels, value in samples])
+
+def counter_family(name: str, help: str, samples: List[Tuple[Dict[str, str], float]]) -> Family:
+    """收集回调中构造一组 counter 样本"""
+    return (name, "counter", help, [(name, labels, value) for labels, value in samples])
+
+def cache_families(prefix: str, stats: Optional[Dict[str, float]], labels: Optional[Dict[str, str]] = None) -> List[Family]:
+    """把缓存的 stats()（size/hits/misses）转换为指标"""
+    if not stats:
+        return []
+    labels = labels or {}
+    return [
+        gauge_family(f"{prefix}_size", "Current number of cached entries", [(labels, stats.get("size", 0))]),
+        counter_family(f"{prefix}_hits_total", "Cache hits", [(labels, stats.get("hits", 0))]),
+        counter_family(f"{prefix}_misses_total", "Cache misses", [(labels, stats.get("misses", 0))]),
+    ]
@@ -0,0 +1,59 @@
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+# SM-2 参数
+MIN_EASINESS = 1.3
+DEFAULT_EASINESS = 2.5
+MAX_INTERVAL_DAYS = 365
+
+# 统一转换为不带时区的 UTC 时间（SQLite 不保存时区信息）
+def to_utc_naive(value: datetime) -> datetime:
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+# 掌握程度 (1 ~ 10) 映射到 SM-2 的回忆质量 (0 ~ 5)
+def recall_quality(mastery_level: int) -> int:
+    return round((int(mastery_level) - 1) * 5 / 9)
+
+# 由回忆质量推算难度系数（未单独存储难度系数，按 SM-2 公式从默认值推算一次）
+def easiness(quality: int) -> float:
+    delta = 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02)
+    return max(MIN_EASINESS, DEFAULT_EASINESS + delta)
+
+def next_interval(quality: int, previous: Optional[timedelta]) -> timedelta:
+    """
+    计算下一次复习间隔
+
+    :param quality: 回忆质量 (0 ~ 5)
+    :param previous: 上一次的复习间隔（next_review - last_reviewed），首次学习为 None
+    """
+    if quality < 3 or previous is None or previous < timedelta(days=1):
+        return timedelta(days=1)
+    if previous < timedelta(days=6):
+        return timedelta(days=6)
+    days = min(MAX_INTERVAL_DAYS, round(previous.total_seconds() / 86400 * easiness(quality)))
+    return timedelta(days=days)
+
+def schedule_review(
+    mastery_level: int,
+    reviewed_at: datetime,
+    last_reviewed: Optional[datetime] = None,
+    next_review: Optional[datetime] = None
+) -> datetime:
+    """
+    根据本次复习结果计算下一次复习时间
+
+    :param mastery_level: 本次提交的掌握程度
+    :param reviewed_at: 本次复习时间
+    :param last_reviewed: 已有进度的上次复习时间
+    :param next_review: 已有进度的计划复习时间
+    """
+    reviewed_at = to_utc_naive(reviewed_at)
+    previous = None
+    if last_reviewed is not None and next_review is not None:
+        previous = to_utc_naive(next_review) - to_utc_naive(last_reviewed)
+    return reviewed_at + next_interval(recall_quality(mastery_level), previous)
@@ -0,0 +1,339 @@
+import os
+import re
+import json
+import struct
+import bisect
+from array import array
+from typing import Optional, List, Dict, Iterable, Tuple, Set, Union, Any
+
+from utils.logging import logger
+
+SPELL_MAX_DISTANCE = int(os.getenv("SPELL_MAX_DISTANCE", "2"))
+SPELL_PREFIX_LENGTH = int(os.getenv("SPELL_PREFIX_LENGTH", "7"))
+
+# 词频排名缺失时排在最后
+RANK_NONE = 0x7fffffff
+
+# 不超过该长度的短词只允许 1 次编辑，否则候选过多且大多没有参考价值
+SHORT_WORD_LENGTH = 4
+
+# 只为单个英文单词建立纠错索引，词组与符号不参与
+WORD_PATTERN = re.compile(r"^[a-z][a-z'\-]*$")
+
+def edit_distance(a: str, b: str, max_distance: int) -> int:
+    """
+    计算受限 Damerau-Levenshtein 距离（相邻字符交换计为一次编辑）
+
+    只计算对角线两侧 max_distance 宽的带状区域，超过 max_distance 时提前返回 max_distance + 1
+    """
+    if a == b:
+        return 0
+    # 去掉公共前缀与后缀，拼写错误通常只涉及少数几个字符
+    start = 0
+    limit = min(len(a), len(b))
+    while start < limit and a[start] == b[start]:
+        start += 1
+    end = 0
+    limit -= start
+    while end < limit and a[-1 - end] == b[-1 - end]:
+        end += 1
+    a = a[start:len(a) - end]
+    b = b[start:len(b) - end]
+    n, m = len(a), len(b)
+    if abs(n - m) > max_distance:
+        return max_distance + 1
+    if n == 0 or m == 0:
+        return n or m
+    big = max_distance + 1
+    prev2: List[int] = []
+    prev = [j if j <= max_distance else big for j in range(m + 1)]
+    for i in range(1, n + 1):
+        current = [big] * (m + 1)
+        if i <= max_distance:
+            current[0] = i
+        lowest = big
+        ca = a[i - 1]
+        for j in range(max(1, i - max_distance), min(m, i + max_distance) + 1):
+            value = prev[j - 1] if ca == b[j - 1] else prev[j - 1] + 1
+            if prev[j] + 1 < value:
+                value = prev[j] + 1
+            if current[j - 1] + 1 < value:
+                value = current[j - 1] + 1
+            if i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == b[j - 1] and prev2[j - 2] + 1 < value:
+                value = prev2[j - 2] + 1
+            current[j] = value
+            if value < lowest:
+                lowest = value
+        if lowest > max_distance:
+            return big
+        prev2, prev = prev, current
+    return min(prev[m], big)
+
+class DeleteTable:
+    """
+    从索引文件加载的删除变体表（只读），变体按字典序排列，
+    starts/ids 记录每个变体对应的单词编号区间，查询用二分查找，加载时不需要构建字典
+    """
+
+    def __init__(self, keys: List[str], starts: array, ids: array):
+        self.keys = keys
+        self.starts = starts
+        self.ids = ids
+
+    def get(self, key: str, default=None) -> Union[int, List[int], None]:
+        keys = self.keys
+        i = bisect.bisect_left(keys, key)
+        if i >= len(keys) or keys[i] != key:
+            return default
+        start, end = self.starts[i], self.starts[i + 1]
+        if end - start == 1:
+            return self.ids[start]
+        return self.ids[start:end].tolist()
+
+    def items(self):
+        for key in self.keys:
+            yield key, self.get(key)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+class SpellingIndex:
+    """
+    SymSpell 风格的拼写纠错索引
+
+    预先为每个单词（前 prefix_length 个字符）生成删除至多 max_distance 个字符的变体，
+    查询时只需生成输入的删除变体并查表，再用编辑距离校验候选，无需遍历词表
+    """
+
+    # 索引文件：头部、frq、bnc、变体区间起点、单词编号、单词、变体、词典标识（JSON）
+    MAGIC = b"VXSPL002"
+    HEADER = struct.Struct("<8sIIIIIIII")
+
+    def __init__(self, max_distance: int = SPELL_MAX_DISTANCE, prefix_length: int = SPELL_PREFIX_LENGTH):
+        """
+        :param max_distance: 最大编辑距离
+        :param prefix_length: 参与生成删除变体的前缀长度，越短索引越小
+        """
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        self.source = None  # 建立索引时的词典内容标识
+        self._words: List[str] = []     # 原始拼写
+        self._keys: List[str] = []      # 小写形式
+        self._frq = array("i")
+        self._bnc = array("i")
+        self._index: Dict[str, int] = {}
+        # 删除变体 -> 单词编号，只有一个单词时直接存整数以节省内存；从文件加载时为 DeleteTable
+        self._deletes: Union[Dict[str, Union[int, List[int]]], DeleteTable] = {}
+
+    def __len__(self) -> int:
+        return len(self._words)
+
+    def _distance_for(self, word: str) -> int:
+        return 1 if len(word) <= SHORT_WORD_LENGTH else self.max_distance
+
+    def _variants(self, word: str, max_distance: int) -> Set[str]:
+        """生成删除至多 max_distance 个字符的全部变体（包含自身）"""
+        result = {word}
+        frontier = [word]
+        for _ in range(max_distance):
+            following = []
+            for item in frontier:
+                if len(item) <= 1:
+                    continue
+                for i in range(len(item)):
+                    variant = item[:i] + item[i + 1:]
+                    if variant not in result:
+                        result.add(variant)
+                        following.append(variant)
+            frontier = following
+        return result
+
+    def add(self, word: str, frq: int = 0, bnc: int = 0) -> bool:
+        """加入一个单词，同一单词（忽略大小写）保留排名更高的拼写"""
+        key = word.lower()
+        if not WORD_PATTERN.match(key):
+            return False
+        frq = frq or RANK_NONE
+        bnc = bnc or RANK_NONE
+        id = self._index.get(key)
+        if id is not None:
+            if (frq, bnc) < (self._frq[id], self._bnc[id]):
+                self._words[id] = word
+                self._frq[id] = frq
+                self._bnc[id] = bnc
+            return False
+        id = len(self._words)
+        self._index[key] = id
+        self._words.append(word)
+        self._keys.append(key)
+        self._frq.append(frq)
+        self._bnc.append(bnc)
+        if isinstance(self._deletes, DeleteTable):
+            self._deletes = dict(self._deletes.items())
+        deletes = self._deletes
+        for variant in self._variants(key[:self.prefix_length], self._distance_for(key)):
+            ids = deletes.get(variant)
+            if ids is None:
+                deletes[variant] = id
+            elif isinstance(ids, int):
+                deletes[variant] = [ids, id]
+            else:
+                ids.append(id)
+        return True
+
+    @classmethod
+    def build(cls, entries: Iterable[Tuple[str, Optional[int], Optional[int]]], **kwargs) -> "SpellingIndex":
+        """从 (word, frq, bnc) 序列建立索引"""
+        index = cls(**kwargs)
+        for word, frq, bnc in entries:
+            if word:
+                index.add(word, frq or 0, bnc or 0)
+        return index
+
+    def lookup(self, word: str, limit: int = 5, max_distance: Optional[int] = None) -> List[Tuple[str, int]]:
+        """
+        返回拼写最接近的候选单词
+
+        :param word: 输入（可能拼错的）单词
+        :param limit: 最多返回的候选数
+        :param max_distance: 最大编辑距离，不超过建立索引时的设置，短词最多为 1
+        :return: [(单词, 编辑距离)]，按编辑距离、词频排名排序
+        """
+        key = word.strip().lower()
+        if not key:
+            return []
+        if max_distance is None or max_distance > self._distance_for(key):
+            max_distance = self._distance_for(key)
+        candidates: Set[int] = set()
+        deletes = self._deletes
+        for variant in self._variants(key[:self.prefix_length], max_distance):
+            ids = deletes.get(variant)
+            if ids is None:
+                continue
+            if isinstance(ids, int):
+                candidates.add(ids)
+            else:
+                candidates.update(ids)
+        results = []
+        keys = self._keys
+        size = len(key)
+        for id in candidates:
+            if abs(len(keys[id]) - size) > max_distance:
+                continue
+            distance = edit_distance(key, keys[id], max_distance)
+            if distance <= max_distance:
+                results.append((distance, self._frq[id], self._bnc[id], id))
+        results.sort()
+        return [(self._words[id], distance) for distance, _, _, id in results[:limit]]
+
+    def save(self, filename: str):
+        """持久化到文件（纯数据格式，不使用 pickle），先写临时文件再替换，避免读到写了一半的索引"""
+        if isinstance(self._deletes, DeleteTable):
+            keys, starts, ids = self._deletes.keys, self._deletes.starts, self._deletes.ids
+        else:
+            keys = sorted(self._deletes)
+            starts = array("I", [0])
+            ids = array("I")
+            for key in keys:
+                value = self._deletes[key]
+                if isinstance(value, int):
+                    ids.append(value)
+                else:
+                    ids.extend(value)
+                starts.append(len(ids))
+        words = "\n".join(self._words).encode("utf-8")
+        variants = "\n".join(keys).encode("utf-8")
+        source = json.dumps(self.source).encode("utf-8")
+        header = self.HEADER.pack(
+            self.MAGIC, self.max_distance, self.prefix_length, len(self._words),
+            len(keys), len(ids), len(words), len(variants), len(source)
+        )
+        temp = filename + ".tmp"
+        with open(temp, "wb") as fp:
+            fp.write(header)
+            for data in (self._frq, self._bnc, starts, ids):
+                fp.write(data.tobytes())
+            fp.write(words)
+            fp.write(variants)
+            fp.write(source)
+        os.replace(temp, filename)
+
+    @classmethod
+    def load(cls, filename: str) -> "SpellingIndex":
+        with open(filename, "rb") as fp:
+            content = fp.read()
+        header = cls.HEADER
+        if len(content) < header.size:
+            raise ValueError("bad spelling index: %s" % filename)
+        magic, max_distance, prefix_length, nwords, nkeys, nids, nwordblob, nkeyblob, nsource = \
+            header.unpack_from(content, 0)
+        if magic != cls.MAGIC:
+            raise ValueError("unsupported spelling index: %s" % filename)
+        pos = header.size
+        arrays = []
+        for code, size in (("i", nwords), ("i", nwords), ("I", nkeys + 1), ("I", nids)):
+            data = array(code)
+            data.frombytes(content[pos:pos + size * 4])
+            arrays.append(data)
+            pos += size * 4
+        blobs = []
+        for size in (nwordblob, nkeyblob, nsource):
+            blobs.append(content[pos:pos + size].decode("utf-8"))
+            pos += size
+        words = blobs[0].split("\n") if nwords else []
+        keys = blobs[1].split("\n") if nkeys else []
+        if pos != len(content) or len(words) != nwords or len(keys) != nkeys:
+            raise ValueError("bad spelling index: %s" % filename)
+        index = cls(max_distance, prefix_length)
+        source = json.loads(blobs[2])
+        index.source = tuple(source) if isinstance(source, list) else source
+        index._words = words
+        index._keys = [word.lower() for word in words]
+        index._frq, index._bnc = arrays[0], arrays[1]
+        index._index = {key: id for id, key in enumerate(index._keys)}
+        index._deletes = DeleteTable(keys, arrays[2], arrays[3])
+        return index
+
+def dictionary_stamp(dictfile: str, count: int) -> Tuple[Any, ...]:
+    """
+    词典内容标识：文件大小与修改时间、WAL 文件大小与修改时间、单词数，
+    WAL 中尚未写回主文件的修改也会改变标识；空的 WAL 文件（只读连接打开时创建）不计入
+    """
+    st = os.stat(dictfile)
+    wal = (0, 0)
+    try:
+        wst = os.stat(dictfile + "-wal")
+        if wst.st_size > 0:
+            wal = (wst.st_size, wst.st_mtime_ns)
+    except OSError:
+        pass
+    return (st.st_size, st.st_mtime_ns) + wal + (count,)
+
+def open_spelling_index(dictfile: str, loader, stamp, filename: Optional[str] = None) -> SpellingIndex:
+    """
+    加载与词典文件放在一起的纠错索引，不存在或已过期时重新建立并保存
+
+    :param dictfile: 词典数据库路径
+    :param loader: 返回 (word, frq, bnc) 序列的函数，仅在需要重建时调用
+    :param stamp: 词典内容标识（见 dictionary_stamp），与索引中记录的不一致时重建
+    :param filename: 索引文件路径，默认为 词典路径 + ".spell"
+    """
+    filename = filename or dictfile + ".spell"
+    stamp = tuple(stamp)
+    if os.path.exists(filename):
+        try:
+            index = SpellingIndex.load(filename)
+            if index.source == stamp and index.max_distance == SPELL_MAX_DISTANCE \
+                    and index.prefix_length == SPELL_PREFIX_LENGTH:
+                logger.info("拼写纠错索引已加载: %s（%d 个单词）", filename, len(index))
+                return index
+        except (OSError, ValueError, struct.error) as e:
+            logger.warning("拼写纠错索引无法读取，将重新建立: %s", e)
+    index = SpellingIndex.build(loader())
+    index.source = stamp
+    try:
+        index.save(filename)
+    except OSError as e:
+        logger.warning("拼写纠错索引保存失败: %s", e)
+    logger.info("拼写纠错索引已建立: %s（%d 个单词）", filename, len(index))
+    return index
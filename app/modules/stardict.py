@@ -17,6 +17,28 @@ import io
 import csv
 import sqlite3
 import codecs
+import copy
+import threading
+import collections
+import contextlib
+import bisect
+import heapq
+import mmap
+import array
+import struct
+import zlib
+import tempfile
+import re
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+try:
+    from urllib.parse import quote as url_quote
+except ImportError:
+    from urllib import quote as url_quote
 
 try:
     import json
@@ -33,6 +55,76 @@ if sys.version_info[0] >= 3:
     unicode = str
     long = int
     xrange = range
+    intern = sys.intern
+
+
+#----------------------------------------------------------------------
+# 单条语句绑定变量数的保守上限（旧版 SQLite 默认 SQLITE_MAX_VARIABLE_NUMBER 为 999）
+#----------------------------------------------------------------------
+SQLITE_MAX_VARIABLE = 900
+
+
+#----------------------------------------------------------------------
+# 可在批量导入期间删除并重建的辅助索引
+#----------------------------------------------------------------------
+STARDICT_INDEXES = (
+    ('stardict_2', 'CREATE UNIQUE INDEX IF NOT EXISTS "stardict_2" ON stardict (word);'),
+    ('stardict_3', 'CREATE INDEX IF NOT EXISTS "stardict_3" ON stardict (sw, word collate nocase);'),
+    ('sd_1', 'CREATE INDEX IF NOT EXISTS "sd_1" ON stardict (word collate nocase);'),
+)
+
+
+#----------------------------------------------------------------------
+# SQLite 连接配置（PRAGMA），None 表示保持默认
+#----------------------------------------------------------------------
+PROFILE_DEFAULT = {}
+
+# 服务端查询：WAL、内存映射、较大的页缓存，临时表放内存
+PROFILE_SERVER = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,       # 负数单位为 KB，即 64MB
+    'temp_store': 'MEMORY',
+    'busy_timeout': 5000,
+}
+
+# 只读连接不能修改日志模式
+PROFILE_READONLY_SKIP = ('journal_mode', 'synchronous')
+
+
+#----------------------------------------------------------------------
+# 全文索引：无内容（contentless）FTS5 表，由 StarDict 的写入方法显式同步
+# unicode61 会把连续汉字当成一个词，因此写入前用 fts_text 在每个汉字
+# （及假名、谚文）两侧加空格，使其逐字成词，查询时按短语匹配；
+# 文件中不保存依赖 Python 函数的触发器，其它工具仍可正常写入词典，
+# 但不经过 StarDict 的修改不会进入索引，需要调用 enable_fts 重建
+#----------------------------------------------------------------------
+STARDICT_FTS_TABLE = '''
+CREATE VIRTUAL TABLE IF NOT EXISTS "stardict_fts" USING fts5(
+    word, definition, translation, content = '', tokenize = '%s'
+);
+'''
+
+# 旧版本创建的同步触发器，调用了 stardict_fts_text，打开可写连接时删除
+STARDICT_FTS_TRIGGERS = ('stardict_fts_ai', 'stardict_fts_ad', 'stardict_fts_au')
+
+# 从 stardict 表整体重建全文索引
+STARDICT_FTS_REBUILD = '''
+INSERT INTO stardict_fts(rowid, word, definition, translation)
+SELECT id, stardict_fts_text(word), stardict_fts_text(definition), 
+    stardict_fts_text(translation) FROM stardict;
+'''
+
+# bm25 列权重：word, definition, translation
+STARDICT_FTS_WEIGHTS = (10.0, 1.0, 5.0)
+
+
+#----------------------------------------------------------------------
+# 前缀查询的上界：前缀 + 最大码位，[prefix, prefix + PREFIX_END) 即前缀区间
+#----------------------------------------------------------------------
+PREFIX_END = u'\U0010ffff'
+RANK_NONE = 0x7fffffff
 
 
 #----------------------------------------------------------------------
@@ -42,18 +134,128 @@ def stripword(word):
     return (''.join([ n for n in word if n.isalnum() ])).lower()
 
 
+#----------------------------------------------------------------------
+# 全文索引文本：汉字、假名、谚文逐字分开
+#----------------------------------------------------------------------
+FTS_CJK_PATTERN = re.compile(u'([\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff'
+        u'\uac00-\ud7af\uf900-\ufaff])')
+
+def fts_text(text):
+    if not text:
+        return text
+    return FTS_CJK_PATTERN.sub(u' \\1 ', text)
+
+
+#----------------------------------------------------------------------
+# QueryCache：查询结果的 LRU 缓存，支持容量与过期时间
+# generation 在 clear 时加一：查询前取得，put 时不一致说明查询期间缓存
+# 已被清空（数据已变），丢弃这次结果，避免把旧数据放回缓存
+#----------------------------------------------------------------------
+class QueryCache (object):
+
+    MISSING = object()
+
+    def __init__ (self, size = 4096, ttl = 0):
+        self.size = size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.generation = 0
+        self.__lock = threading.Lock()
+        self.__items = collections.OrderedDict()
+
+    # 取得缓存，未命中返回 QueryCache.MISSING（None 本身也是可缓存的结果）
+    def get (self, key):
+        with self.__lock:
+            item = self.__items.get(key, None)
+            if item is None:
+                self.misses += 1
+                return self.MISSING
+            expire, value = item
+            if expire and expire < time.time():
+                del self.__items[key]
+                self.misses += 1
+                return self.MISSING
+            self.__items.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put (self, key, value, generation = None):
+        if self.size <= 0:
+            return False
+        expire = self.ttl and (time.time() + self.ttl) or 0
+        with self.__lock:
+            if generation is not None and generation != self.generation:
+                return False
+            self.__items[key] = (expire, value)
+            self.__items.move_to_end(key)
+            while len(self.__items) > self.size:
+                self.__items.popitem(last = False)
+        return True
+
+    def clear (self):
+        with self.__lock:
+            self.__items.clear()
+            self.generation += 1
+        return True
+
+    def stats (self):
+        total = self.hits + self.misses
+        return {
+            'size': len(self.__items),
+            'capacity': self.size,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': total and (float(self.hits) / total) or 0.0,
+        }
+
+    def __len__ (self):
+        return len(self.__items)
+
+
+#----------------------------------------------------------------------
+# 数据库文件标识：主文件与 WAL 文件的大小、修改时间，文件被改写后即不同
+#----------------------------------------------------------------------
+STAMP_INTERVAL = 1.0
+
+def file_stamp(filename):
+    stamp = []
+    for name in (filename, filename + '-wal'):
+        try:
+            st = os.stat(name)
+            stamp.append((st.st_size, st.st_mtime_ns))
+        except OSError:
+            stamp.append(None)
+    return tuple(stamp)
+
+
 #----------------------------------------------------------------------
 # StarDict 
 #----------------------------------------------------------------------
 class StarDict (object):
 
-    def __init__ (self, filename, verbose = False):
+    # profile: PRAGMA 配置（见 PROFILE_SERVER）
+    # readonly: 以只读方式打开（mode=ro + query_only），可跨线程使用
+    # cache: 共享的 QueryCache 实例，优先于 cache_size/cache_ttl
+    # fts: 创建并维护释义/翻译的 FTS5 全文索引（可写连接有效）
+    def __init__ (self, filename, verbose = False, cache_size = 0, 
+            cache_ttl = 0, profile = None, readonly = False, cache = None,
+            fts = False):
         self.__dbname = filename
         if filename != ':memory:':
-            os.path.abspath(filename)
+            filename = os.path.abspath(filename)
+        self.__path = filename
         self.__conn = None
         self.__verbose = verbose
+        self.__profile = profile or PROFILE_DEFAULT
+        self.__readonly = readonly
+        self.__cache = cache
+        if cache is None and cache_size > 0:
+            self.__cache = QueryCache(cache_size, cache_ttl)
         self.__open()
+        if fts and not readonly and not self.fts_enabled():
+            self.enable_fts()
 
     # 初始化并创建必要的表格和索引
     def __open (self):
@@ -76,19 +278,33 @@ class StarDict (object):
             "audio" TEXT
         );
         CREATE UNIQUE INDEX IF NOT EXISTS "stardict_1" ON stardict (id);
-        CREATE UNIQUE INDEX IF NOT EXISTS "stardict_2" ON stardict (word);
-        CREATE INDEX IF NOT EXISTS "stardict_3" ON stardict (sw, word collate nocase);
-        CREATE INDEX IF NOT EXISTS "sd_1" ON stardict (word collate nocase);
         '''
+        sql += '\n'.join([ n for _, n in STARDICT_INDEXES ])
+        sql += '\n'.join([ 'DROP TRIGGER IF EXISTS "%s";'%n 
+            for n in STARDICT_FTS_TRIGGERS ])
+
+        if self.__readonly:
+            # 路径中的 ?、#、% 等字符需要转义，否则会被当作 URI 的一部分
+            path = url_quote(self.__path.replace(os.sep, '/'), safe = '/:')
+            uri = 'file:%s?mode=ro'%path
+            self.__conn = sqlite3.connect(uri, uri = True, 
+                    check_same_thread = False)
+        else:
+            self.__conn = sqlite3.connect(self.__dbname, isolation_level = "IMMEDIATE")
+            self.__conn.isolation_level = "IMMEDIATE"
 
-        self.__conn = sqlite3.connect(self.__dbname, isolation_level = "IMMEDIATE")
-        self.__conn.isolation_level = "IMMEDIATE"
+        self.__apply_profile(self.__profile)
+        # 只在本连接内使用（整体重建索引），不写入文件中的触发器或视图
+        self.__conn.create_function('stardict_fts_text', 1, fts_text)
 
-        sql = '\n'.join([ n.strip('\t') for n in sql.split('\n') ])
-        sql = sql.strip('\n')
+        if not self.__readonly:
+            sql = '\n'.join([ n.strip('\t') for n in sql.split('\n') ])
+            sql = sql.strip('\n')
 
-        self.__conn.executescript(sql)
-        self.__conn.commit()
+            self.__conn.executescript(sql)
+            self.__conn.commit()
+        else:
+            self.__conn.execute('PRAGMA query_only = ON;')
 
         fields = ( 'id', 'word', 'sw', 'phonetic', 'definition', 
             'translation', 'pos', 'collins', 'oxford', 'tag', 'bnc', 'frq', 
@@ -98,6 +314,21 @@ class StarDict (object):
         for k, v in self.__fields:
             self.__names[k] = v
         self.__enable = self.__fields[3:]
+        self.__fts = self.fts_enabled()
+        return True
+
+    # 应用 PRAGMA 配置
+    def __apply_profile (self, profile):
+        for name in ('journal_mode', 'synchronous', 'mmap_size', 
+                'cache_size', 'temp_store', 'busy_timeout', 'query_only'):
+            value = profile.get(name, None)
+            if value is None:
+                continue
+            if self.__readonly and name in PROFILE_READONLY_SKIP:
+                continue
+            if isinstance(value, bool):
+                value = value and 'ON' or 'OFF'
+            self.__conn.execute('PRAGMA %s = %s;'%(name, value)).fetchall()
         return True
 
     # 数据库记录转化为字典
@@ -121,6 +352,10 @@ class StarDict (object):
         if self.__conn:
             self.__conn.close()
         self.__conn = None
+
+    # 是否只读
+    def readonly (self):
+        return self.__readonly
     
     def __del__ (self):
         self.close()
@@ -131,8 +366,45 @@ class StarDict (object):
             print(text)
         return True
 
+    # 缓存中的对象可能被调用者修改，返回副本
+    def __copy_obj (self, obj):
+        if obj is None:
+            return None
+        obj = dict(obj)
+        if obj['detail'] is not None:
+            obj['detail'] = copy.deepcopy(obj['detail'])
+        return obj
+
+    # 写操作后使缓存失效
+    def __invalidate (self):
+        if self.__cache is not None:
+            self.__cache.clear()
+
+    # 缓存统计，未启用缓存时返回 None
+    def cache_stats (self):
+        if self.__cache is None:
+            return None
+        return self.__cache.stats()
+
+    # 当前的日志模式（只读连接也可以查询）
+    def journal_mode (self):
+        return self.__conn.execute('PRAGMA journal_mode;').fetchone()[0]
+
     # 查询单词
     def query (self, key):
+        if self.__cache is None:
+            return self.__query(key)
+        if not isinstance(key, (int, long, str, unicode)):
+            return None
+        ck = ('q', key)
+        generation = self.__cache.generation
+        obj = self.__cache.get(ck)
+        if obj is QueryCache.MISSING:
+            obj = self.__query(key)
+            self.__cache.put(ck, obj, generation)
+        return self.__copy_obj(obj)
+
+    def __query (self, key):
         c = self.__conn.cursor()
         record = None
         if isinstance(key, int) or isinstance(key, long):
@@ -146,6 +418,17 @@ class StarDict (object):
 
     # 查询单词匹配
     def match (self, word, limit = 10, strip = False):
+        if self.__cache is None:
+            return self.__match(word, limit, strip)
+        ck = ('m', word, limit, strip)
+        generation = self.__cache.generation
+        result = self.__cache.get(ck)
+        if result is QueryCache.MISSING:
+            result = self.__match(word, limit, strip)
+            self.__cache.put(ck, result, generation)
+        return list(result)
+
+    def __match (self, word, limit = 10, strip = False):
         c = self.__conn.cursor()
         if not strip:
             sql = 'select id, word from stardict where word >= ? '
@@ -161,28 +444,71 @@ class StarDict (object):
             result.append(tuple(record))
         return result
 
+    # 前缀补全：返回以 prefix 开头的单词，按 frq、bnc 词频排名排序
+    def complete (self, prefix, limit = 10):
+        if not prefix:
+            return []
+        c = self.__conn.cursor()
+        sql = 'select id, word from stardict where word >= ? and word < ? '
+        sql += 'order by case when frq > 0 then frq else %d end, '%RANK_NONE
+        sql += 'case when bnc > 0 then bnc else %d end, '%RANK_NONE
+        sql += 'word collate nocase limit ?;'
+        c.execute(sql, (prefix, prefix + PREFIX_END, limit))
+        return [ tuple(record) for record in c.fetchall() ]
+
     # 批量查询
     def query_batch (self, keys):
-        sql = 'select * from stardict where '
+        if self.__cache is None or not keys:
+            return self.__query_batch(keys)
+        results = []
+        missing = []
+        fetched = {}
+        generation = self.__cache.generation
+        for key in keys:
+            obj = QueryCache.MISSING
+            if isinstance(key, (int, long, str, unicode)):
+                obj = self.__cache.get(('q', key))
+                if obj is QueryCache.MISSING:
+                    missing.append(key)
+            results.append(obj)
+        if missing:
+            fetched = self.__query_batch(missing)
+            for key, obj in zip(missing, fetched):
+                self.__cache.put(('q', key), obj, generation)
+            fetched = dict(zip(missing, fetched))
+        for i, key in enumerate(keys):
+            obj = results[i]
+            if obj is QueryCache.MISSING:
+                obj = fetched.get(key, None)
+            results[i] = self.__copy_obj(obj)
+        return tuple(results)
+
+    def __query_batch (self, keys):
         if keys is None:
             return None
         if not keys:
             return []
-        querys = []
+        ids = {}
+        words = {}
         for key in keys:
             if isinstance(key, int) or isinstance(key, long):
-                querys.append('id = ?')
+                ids[key] = 1
             elif key is not None:
-                querys.append('word = ?')
-        sql = sql + ' or '.join(querys) + ';'
+                words[key.lower()] = key
         query_word = {}
         query_id = {}
         c = self.__conn.cursor()
-        c.execute(sql, tuple(keys))
-        for row in c:
-            obj = self.__record2obj(row)
-            query_word[obj['word'].lower()] = obj
-            query_id[obj['id']] = obj
+        # id 和 word 分开走各自的索引做 IN 查询，按变量上限分块
+        for column, values in (('id', list(ids)), ('word', list(words.values()))):
+            for pos in xrange(0, len(values), SQLITE_MAX_VARIABLE):
+                chunk = values[pos:pos + SQLITE_MAX_VARIABLE]
+                sql = 'select * from stardict where %s in (%s);'%(column, 
+                        ','.join(['?'] * len(chunk)))
+                c.execute(sql, tuple(chunk))
+                for row in c:
+                    obj = self.__record2obj(row)
+                    query_word[obj['word'].lower()] = obj
+                    query_id[obj['id']] = obj
         results = []
         for key in keys:
             if isinstance(key, int) or isinstance(key, long):
@@ -200,11 +526,30 @@ class StarDict (object):
         record = c.fetchone()
         return record[0]
 
+    # 遍历 (word, frq, bnc)，供外部构建拼写纠错等辅助索引
+    def ranks (self):
+        c = self.__conn.cursor()
+        c.execute('select "word", "frq", "bnc" from "stardict";')
+        return c.__iter__()
+
+    # 用单个游标按 id 顺序分块读取未解码的原始记录，产出 (列名, 记录列表)
+    def records (self, chunk = 10000):
+        c = self.__conn.cursor()
+        c.execute('select * from "stardict" order by "id";')
+        names = tuple([ n[0] for n in c.description ])
+        while True:
+            rows = c.fetchmany(chunk)
+            if not rows:
+                break
+            yield names, rows
+
     # 注册新单词
     def register (self, word, items, commit = True):
         sql = 'INSERT INTO stardict(word, sw) VALUES(?, ?);'
+        self.__invalidate()
         try:
-            self.__conn.execute(sql, (word, stripword(word)))
+            c = self.__conn.execute(sql, (word, stripword(word)))
+            self.__fts_sync('id = ?', (c.lastrowid,))
         except sqlite3.IntegrityError as e:
             self.out(str(e))
             return False
@@ -214,13 +559,169 @@ class StarDict (object):
         self.update(word, items, commit)
         return True
 
+    # 是否已建立（当前格式的）全文索引，旧的外部内容格式视为未建立
+    def fts_enabled (self):
+        c = self.__conn.cursor()
+        c.execute("SELECT sql FROM sqlite_master WHERE name = 'stardict_fts';")
+        record = c.fetchone()
+        return record is not None and "content = ''" in record[0]
+
+    # 建立全文索引并从现有数据重建，tokenize 为 FTS5 分词器
+    # unicode61 按非字母数字切分，汉字经 fts_text 处理后逐字成词
+    def enable_fts (self, tokenize = 'unicode61'):
+        self.disable_fts()
+        try:
+            self.__conn.execute(STARDICT_FTS_TABLE%tokenize)
+            self.__conn.execute(STARDICT_FTS_REBUILD)
+            self.__conn.commit()
+        except sqlite3.Error as e:
+            self.out(str(e))
+            self.__conn.rollback()
+            return False
+        self.__fts = True
+        return True
+
+    # 删除全文索引
+    def disable_fts (self):
+        for name in STARDICT_FTS_TRIGGERS:
+            self.__conn.execute('DROP TRIGGER IF EXISTS "%s";'%name)
+        self.__conn.execute('DROP TABLE IF EXISTS "stardict_fts";')
+        self.__conn.commit()
+        self.__fts = False
+        return True
+
+    # 同步全文索引：把满足条件的行写入索引，delete 为真时从索引中删除
+    # 无内容表删除时要提供写入时的原文，因此删除须在修改或删除行之前执行
+    def __fts_sync (self, where, args, delete = False):
+        if not self.__fts:
+            return
+        c = self.__conn.cursor()
+        c.execute('SELECT id, word, definition, translation FROM stardict '
+                'WHERE %s;'%where, args)
+        rows = [ (n[0], fts_text(n[1]), fts_text(n[2]), fts_text(n[3])) 
+                for n in c.fetchall() ]
+        if delete:
+            sql = 'INSERT INTO stardict_fts(stardict_fts, rowid, word, '
+            sql += "definition, translation) VALUES('delete', ?, ?, ?, ?);"
+        else:
+            sql = 'INSERT INTO stardict_fts(rowid, word, definition, '
+            sql += 'translation) VALUES(?, ?, ?, ?);'
+        c.executemany(sql, rows)
+
+    # 全文检索释义与翻译（反查），按 bm25 排序，field 可限定为单独一列
+    # 每个词按前缀匹配，中文词按逐字短语匹配（"电脑" 可匹配 "笔记本电脑"），
+    # 返回完整词条，附加 score（越小越相关）
+    def search (self, text, limit = 10, field = None):
+        terms = [ ' '.join(fts_text(n).split()) for n in text.split() ]
+        terms = [ n for n in terms if n ]
+        if not terms:
+            return []
+        expr = ' '.join([ '"%s"*'%n.replace('"', '""') for n in terms ])
+        if field is not None:
+            expr = '{%s} : (%s)'%(field, expr)
+        sql = 'SELECT s.*, bm25(stardict_fts, %s) AS score '%(
+                ', '.join([ str(n) for n in STARDICT_FTS_WEIGHTS ]))
+        sql += 'FROM stardict_fts JOIN stardict s ON s.id = stardict_fts.rowid '
+        sql += 'WHERE stardict_fts MATCH ? ORDER BY score LIMIT ?;'
+        c = self.__conn.cursor()
+        try:
+            c.execute(sql, (expr, limit))
+        except sqlite3.OperationalError as e:
+            self.out(str(e))
+            return []
+        result = []
+        for record in c.fetchall():
+            obj = self.__record2obj(record)
+            obj['score'] = record[-1]
+            result.append(obj)
+        return result
+
+    # 批量导入：items 为 (word, data) 序列，用 executemany 执行单条多列插入
+    # replace 为真时同名单词整行替换（INSERT OR REPLACE，会分配新 id），否则跳过
+    # rebuild_index 为真时先删除辅助索引，导入完成后重建
+    # fast 为真时导入期间关闭同步并使用内存日志，中途崩溃可能损坏数据库，
+    # 只用于可丢弃的目标或离线构建（如先写临时文件再替换），不要用于在线词典
+    # 返回写入条数；出错时回滚全部导入并重新抛出异常
+    def register_many (self, items, replace = True, rebuild_index = False, 
+            fast = False, chunk = 10000):
+        names = [ name for name, _ in self.__enable ]
+        defaults = {'collins': 0, 'oxford': 0}
+        spec = [ (name, defaults.get(name)) for name in names ]
+        detail = names.index('detail') + 2
+        columns = ['word', 'sw'] + names
+        sql = '%s INTO stardict(%s) VALUES(%s);'%(
+                replace and 'INSERT OR REPLACE' or 'INSERT OR IGNORE',
+                ', '.join(columns), ', '.join(['?'] * len(columns)))
+        self.__invalidate()
+        self.__conn.commit()
+        c = self.__conn.cursor()
+        pragmas = None
+        if fast:
+            c.execute('PRAGMA journal_mode;')
+            journal = c.fetchone()[0]
+            c.execute('PRAGMA synchronous;')
+            pragmas = (journal, c.fetchone()[0])
+        try:
+            if pragmas is not None:
+                c.execute('PRAGMA journal_mode = MEMORY;')
+                c.execute('PRAGMA synchronous = OFF;')
+            count = self.__load_many(c, sql, items, spec, detail, 
+                    rebuild_index, chunk)
+        finally:
+            # 无论导入是否成功都恢复原来的同步级别与日志模式
+            if pragmas is not None:
+                c.execute('PRAGMA synchronous = %d;'%pragmas[1])
+                c.execute('PRAGMA journal_mode = %s;'%pragmas[0])
+        return count
+
+    def __load_many (self, c, sql, items, spec, detail, rebuild_index, chunk):
+        dumps = json.dumps
+        if rebuild_index:
+            for name, _ in STARDICT_INDEXES:
+                c.execute('DROP INDEX IF EXISTS "%s";'%name)
+        count = 0
+        rows = []
+        try:
+            for word, data in items:
+                get = data.get
+                row = [word, stripword(word)] + [ get(n, d) for n, d in spec ]
+                if row[detail] is not None:
+                    row[detail] = dumps(row[detail], ensure_ascii = False)
+                rows.append(row)
+                if len(rows) >= chunk:
+                    c.executemany(sql, rows)
+                    count += c.rowcount
+                    rows = []
+            if rows:
+                c.executemany(sql, rows)
+                count += c.rowcount
+            self.__conn.commit()
+        except Exception as e:
+            # 任何异常（包括 items 迭代时抛出的）都整体回滚，不保留部分数据
+            self.out(str(e))
+            self.__conn.rollback()
+            raise
+        finally:
+            if rebuild_index:
+                for _, ddl in STARDICT_INDEXES:
+                    c.execute(ddl)
+            if self.__fts:
+                # 全文索引逐行维护太慢（还要处理整行替换），导入后整体重建
+                c.execute("INSERT INTO stardict_fts(stardict_fts) VALUES('delete-all');")
+                c.execute(STARDICT_FTS_REBUILD)
+            self.__conn.commit()
+        return count
+
     # 删除单词
     def remove (self, key, commit = True):
         if isinstance(key, int) or isinstance(key, long):
-            sql = 'DELETE FROM stardict WHERE id=?;'
+            where = 'id = ?'
         else:
-            sql = 'DELETE FROM stardict WHERE word=?;'
+            where = 'word = ?'
+        sql = 'DELETE FROM stardict WHERE %s;'%where
+        self.__invalidate()
         try:
+            self.__fts_sync(where, (key,), delete = True)
             self.__conn.execute(sql, (key,))
             if commit:
                 self.__conn.commit()
@@ -232,8 +733,11 @@ class StarDict (object):
     def delete_all (self, reset_id = False):
         sql1 = 'DELETE FROM stardict;'
         sql2 = "UPDATE sqlite_sequence SET seq = 0 WHERE name = 'stardict';"
+        self.__invalidate()
         try:
             self.__conn.execute(sql1)
+            if self.__fts:
+                self.__conn.execute("INSERT INTO stardict_fts(stardict_fts) VALUES('delete-all');")
             if reset_id:
                 self.__conn.execute(sql2)
             self.__conn.commit()
@@ -266,11 +770,18 @@ class StarDict (object):
             return False
         sql = 'UPDATE stardict SET ' + ', '.join(['%s=?'%n for n in names])
         if isinstance(key, str) or isinstance(key, unicode):
-            sql += ' WHERE word=?;'
+            where = 'word = ?'
         else:
-            sql += ' WHERE id=?;'
+            where = 'id = ?'
+        sql += ' WHERE %s;'%where
+        fts = 'definition' in names or 'translation' in names
+        self.__invalidate()
         try:
+            if fts:
+                self.__fts_sync(where, (key,), delete = True)
             self.__conn.execute(sql, tuple(values + [key]))
+            if fts:
+                self.__fts_sync(where, (key,))
             if commit:
                 self.__conn.commit()
         except sqlite3.IntegrityError:
@@ -303,6 +814,7 @@ class StarDict (object):
             self.__conn.commit()
         except sqlite3.IntegrityError:
             self.__conn.rollback()
+            self.__invalidate()
             return False
         return True
 
@@ -312,6 +824,299 @@ class StarDict (object):
 
 
 
+#----------------------------------------------------------------------
+# StarDictPool：只读连接池，多个线程可并发查询同一个词典文件
+#----------------------------------------------------------------------
+class StarDictPool (object):
+
+    def __init__ (self, filename, size = 4, profile = None, cache_size = 0,
+            cache_ttl = 0, timeout = None):
+        self.__filename = os.path.abspath(filename)
+        if not os.path.exists(self.__filename):
+            raise IOError('dictionary not found: %s'%self.__filename)
+        self.__profile = profile is None and PROFILE_SERVER or profile
+        self.__timeout = timeout
+        self.__cache = None
+        if cache_size > 0:
+            self.__cache = QueryCache(cache_size, cache_ttl)
+        # 只读连接池不修改词典文件，日志模式需要离线用 set_journal_mode 设置
+        # 词典文件可能被其它进程重建，定期比较文件标识，变化时清空缓存
+        self.__stamp = file_stamp(self.__filename)
+        self.__checked = time.time()
+        self.__size = size
+        self.__idle = queue.Queue()
+        self.__all = []
+        for i in xrange(size):
+            sd = StarDict(self.__filename, profile = self.__profile, 
+                    readonly = True, cache = self.__cache)
+            self.__all.append(sd)
+            self.__idle.put(sd)
+
+    # 距上次检查超过 STAMP_INTERVAL 秒时比较文件标识，变化则清空缓存
+    def __check_stamp (self):
+        now = time.time()
+        if self.__cache is None or now - self.__checked < STAMP_INTERVAL:
+            return False
+        self.__checked = now
+        stamp = file_stamp(self.__filename)
+        if stamp == self.__stamp:
+            return False
+        self.__stamp = stamp
+        self.__cache.clear()
+        return True
+
+    # 借出一个连接，用完自动归还
+    @contextlib.contextmanager
+    def connection (self):
+        self.__check_stamp()
+        sd = self.__idle.get(timeout = self.__timeout)
+        try:
+            yield sd
+        finally:
+            self.__idle.put(sd)
+
+    def query (self, key):
+        with self.connection() as sd:
+            return sd.query(key)
+
+    def match (self, word, limit = 10, strip = False):
+        with self.connection() as sd:
+            return sd.match(word, limit, strip)
+
+    def query_batch (self, keys):
+        with self.connection() as sd:
+            return sd.query_batch(keys)
+
+    def complete (self, prefix, limit = 10):
+        with self.connection() as sd:
+            return sd.complete(prefix, limit)
+
+    def fts_enabled (self):
+        with self.connection() as sd:
+            return sd.fts_enabled()
+
+    def journal_mode (self):
+        with self.connection() as sd:
+            return sd.journal_mode()
+
+    def search (self, text, limit = 10, field = None):
+        with self.connection() as sd:
+            return sd.search(text, limit, field)
+
+    def count (self):
+        with self.connection() as sd:
+            return sd.count()
+
+    def ranks (self):
+        with self.connection() as sd:
+            return list(sd.ranks())
+
+    def cache_stats (self):
+        if self.__cache is None:
+            return None
+        return self.__cache.stats()
+
+    def size (self):
+        return self.__size
+
+    def close (self):
+        for sd in self.__all:
+            sd.close()
+        self.__all = []
+        return True
+
+    def __len__ (self):
+        return self.count()
+
+    def __contains__ (self, key):
+        return self.query(key) is not None
+
+    def __getitem__ (self, key):
+        return self.query(key)
+
+
+#----------------------------------------------------------------------
+# DictMmap：内存映射读取 DictHelper.export_stardict 导出的 .idx/.dict
+# 索引与释义都不读入内存，多个进程打开同一文件时共享页缓存；
+# 词条起始偏移保存在 .ofs 旁路文件中（首次打开时生成），之后打开无需扫描
+# .ofs 记录 .idx 的大小、修改时间与首尾校验和，任何一项不一致即重新生成
+# query 返回的 definition 是 .dict 映射上的 memoryview，未做拷贝
+#----------------------------------------------------------------------
+class DictMmap (object):
+
+    OFS_MAGIC = b'VXOFS002'
+    # magic, .idx 大小, .idx st_mtime_ns, .idx 首尾校验和, 词条数
+    OFS_HEADER = struct.Struct('<8sQqIQ')
+    # 参与校验和的首尾字节数
+    OFS_SAMPLE = 65536
+
+    def __init__ (self, filename):
+        mainname = os.path.splitext(filename)[0]
+        self.__mainname = mainname
+        self.__files = []
+        self.__idx = self.__map(mainname + '.idx')
+        self.__dict = self.__map(mainname + '.dict')
+        self.__data = memoryview(self.__dict)
+        self.__offsets = self.__load_offsets(mainname + '.ofs')
+
+    def __map (self, filename):
+        fp = open(filename, 'rb')
+        self.__files.append(fp)
+        if os.fstat(fp.fileno()).st_size == 0:
+            return b''
+        return mmap.mmap(fp.fileno(), 0, access = mmap.ACCESS_READ)
+
+    # .idx 的标识：(大小, 修改时间, 首尾校验和)，同大小重新导出时也能发现
+    def __idx_stamp (self):
+        idx = self.__idx
+        size = len(idx)
+        mtime = os.fstat(self.__files[0].fileno()).st_mtime_ns
+        sample = self.OFS_SAMPLE
+        crc = zlib.crc32(idx[:sample])
+        crc = zlib.crc32(idx[max(sample, size - sample):], crc)
+        return size, mtime, crc & 0xffffffff
+
+    # 读取或生成词条偏移表
+    def __load_offsets (self, ofsname):
+        size, mtime, crc = self.__idx_stamp()
+        header = self.OFS_HEADER
+        if os.path.exists(ofsname):
+            mm = self.__map(ofsname)
+            if len(mm) >= header.size:
+                magic, idxsize, idxtime, idxcrc, count = header.unpack_from(mm, 0)
+                if magic == self.OFS_MAGIC and (idxsize, idxtime, idxcrc) == \
+                        (size, mtime, crc):
+                    view = memoryview(mm)[header.size:]
+                    if len(view) == count * 4:
+                        return view.cast('I')
+        offsets = array.array('I')
+        idx = self.__idx
+        pos = 0
+        while pos < size:
+            offsets.append(pos)
+            end = idx.find(b'\x00', pos)
+            if end < 0:
+                break
+            pos = end + 9
+        # 先写临时文件再替换，其它进程不会读到写了一半的偏移表
+        temp = ofsname + '.tmp'
+        try:
+            with open(temp, 'wb') as fp:
+                fp.write(header.pack(self.OFS_MAGIC, size, mtime, crc, 
+                    len(offsets)))
+                fp.write(offsets.tobytes())
+            os.replace(temp, ofsname)
+        except (IOError, OSError):
+            pass
+        return memoryview(offsets)
+
+    # 第 i 个词条：(单词, 释义偏移, 释义长度)
+    def __entry (self, i):
+        idx = self.__idx
+        start = self.__offsets[i]
+        end = idx.find(b'\x00', start)
+        word = idx[start:end].decode('utf-8', 'ignore')
+        offset, size = struct.unpack_from('>II', idx, end + 1)
+        return word, offset, size
+
+    def __word (self, i):
+        idx = self.__idx
+        start = self.__offsets[i]
+        return idx[start:idx.find(b'\x00', start)].decode('utf-8', 'ignore')
+
+    # 二分查找第一个 (小写, 原词) >= key 的词条，与导出时的排序规则一致
+    def __lower_bound (self, key):
+        top = 0
+        bottom = len(self.__offsets)
+        while top < bottom:
+            middle = (top + bottom) >> 1
+            word = self.__word(middle)
+            if (word.lower(), word) < key:
+                top = middle + 1
+            else:
+                bottom = middle
+        return top
+
+    def __find (self, word):
+        lower = word.lower()
+        i = self.__lower_bound((lower, word))
+        if i < len(self.__offsets) and self.__word(i) == word:
+            return i
+        # 不区分大小写：取小写相同的第一个词条
+        i = self.__lower_bound((lower, u''))
+        if i < len(self.__offsets) and self.__word(i).lower() == lower:
+            return i
+        return -1
+
+    def close (self):
+        self.__offsets = None
+        self.__data = None
+        for obj in (self.__idx, self.__dict):
+            if isinstance(obj, mmap.mmap):
+                try:
+                    obj.close()
+                except BufferError:
+                    pass    # 仍有 memoryview 引用，交给垃圾回收
+        for fp in self.__files:
+            fp.close()
+        self.__files = []
+
+    # 查询单词
+    def query (self, key):
+        if isinstance(key, int) or isinstance(key, long):
+            i = key
+            if i < 0 or i >= len(self.__offsets):
+                return None
+        elif isinstance(key, str) or isinstance(key, unicode):
+            i = self.__find(key)
+            if i < 0:
+                return None
+        else:
+            return None
+        word, offset, size = self.__entry(i)
+        return {
+            'id': i,
+            'word': word,
+            'definition': self.__data[offset:offset + size],
+        }
+
+    # 查询释义文本（解码为字符串）
+    def text (self, key):
+        obj = self.query(key)
+        if obj is None:
+            return None
+        return obj['definition'].tobytes().decode('utf-8', 'ignore')
+
+    # 查询单词匹配，格式不含 sw 列，strip 参数仅为接口兼容
+    def match (self, word, limit = 10, strip = False):
+        i = self.__lower_bound((word.lower(), u''))
+        last = min(i + limit, len(self.__offsets))
+        return [ (n, self.__word(n)) for n in xrange(i, last) ]
+
+    def query_batch (self, keys):
+        if keys is None:
+            return None
+        return tuple([ self.query(key) for key in keys ])
+
+    def count (self):
+        return len(self.__offsets)
+
+    def __len__ (self):
+        return self.count()
+
+    def __contains__ (self, key):
+        return self.query(key) is not None
+
+    def __getitem__ (self, key):
+        return self.query(key)
+
+    def __iter__ (self):
+        return ( (i, self.__word(i)) for i in xrange(self.count()) )
+
+    def dumps (self):
+        return [ n for _, n in self.__iter__() ]
+
+
 #----------------------------------------------------------------------
 # startup MySQLdb
 #----------------------------------------------------------------------
@@ -657,13 +1462,28 @@ COLUMN_SD = COLUMN_SIZE + 1
 COLUMN_SW = COLUMN_SIZE + 2
 
 
+# 紧凑模式下共享字符串对象的短字段：pos, collins, oxford, tag, bnc, frq
+COMPACT_INTERN = (4, 5, 6, 7, 8, 9)
+
+
+# 小写键：本身已是小写时复用原字符串对象，避免重复占用内存
+def lowerkey(word):
+    lower = word.lower()
+    if lower == word:
+        return word
+    return lower
+
+
 #----------------------------------------------------------------------
 # DictCsv
+# compact 为真时使用紧凑存储：行为不可变元组，短字段共享字符串，
+# 不建立单词字典（查找走有序键数组二分），字段仍保持编码文本，访问时才解码
 #----------------------------------------------------------------------
 class DictCsv (object):
 
-    def __init__ (self, filename, codec = 'utf-8'):
+    def __init__ (self, filename, codec = 'utf-8', compact = False):
         self.__csvname = None
+        self.__compact = compact
         if filename is not None:
             self.__csvname = os.path.abspath(filename)
         self.__codec = codec
@@ -680,19 +1500,51 @@ class DictCsv (object):
             numbers.append(self.__names[name])
         self.__numbers = tuple(numbers)
         self.__enable = self.__fields[1:]
-        self.__dirty = False
-        self.__words = {}
+        self.__words = (not compact) and {} or None
         self.__rows = []
         self.__index = []
+        self.__keys = []
+        self.__skeys = []
         self.__read()
 
     def reset (self):
-        self.__dirty = False
-        self.__words = {}
+        self.__words = (not self.__compact) and {} or None
         self.__rows = []
         self.__index = []
+        self.__keys = []
+        self.__skeys = []
         return True
 
+    # 预先计算与 __rows/__index 平行的有序键数组，供 bisect 查找与插入
+    # __rows 按小写单词排序，__index 按 (sw, 小写单词) 排序
+    def __build_keys (self):
+        self.__keys = [ lowerkey(row[0]) for row in self.__rows ]
+        self.__skeys = [ (row[COLUMN_SW], lowerkey(row[0])) for row in self.__index ]
+
+    # 根据小写单词找到行
+    def __find (self, lower):
+        if self.__words is not None:
+            return self.__words.get(lower, None)
+        pos = bisect.bisect_left(self.__keys, lower)
+        if pos < len(self.__keys) and self.__keys[pos] == lower:
+            return self.__rows[pos]
+        return None
+
+    # 紧凑行
+    def __pack (self, row):
+        if not self.__compact:
+            return row
+        row = list(row)
+        for idx in COMPACT_INTERN:
+            if row[idx]:
+                row[idx] = intern(row[idx])
+        row[COLUMN_ID] = row[COLUMN_SD] = None
+        return tuple(row)
+
+    # 单词 id 即其在 __rows 中的位置，插入删除后不再整体重编号，读取时二分得到
+    def __position (self, row):
+        return bisect.bisect_left(self.__keys, row[0].lower())
+
     def encode (self, text):
         if text is None:
             return None
@@ -774,25 +1626,33 @@ class DictCsv (object):
                 row.extend([None] * (COLUMN_SIZE - len(row)))
             if len(row) > COLUMN_SIZE:
                 row = row[:COLUMN_SIZE]
-            word = row[0].lower()
-            if word in words:
-                continue
+            if not self.__compact:
+                word = row[0].lower()
+                if word in words:
+                    continue
+                words[word] = 1
             row.extend([0, 0, stripword(row[0])])
-            words[word] = 1
+            row = self.__pack(row)
             rows.append(row)
-            index.append(row)
+        rows.sort(key = lambda row: row[0].lower())
+        if self.__compact:
+            # 排序是稳定的，相邻重复只保留第一次出现的单词
+            unique = []
+            last = None
+            for row in rows:
+                word = row[0].lower()
+                if word != last:
+                    unique.append(row)
+                    last = word
+            rows = unique
+        index = list(rows)
+        index.sort(key = lambda row: (row[COLUMN_SW], row[0].lower()))
         self.__rows = rows
         self.__index = index
-        self.__rows.sort(key = lambda row: row[0].lower())
-        self.__index.sort(key = lambda row: (row[COLUMN_SW], row[0].lower()))
-        for index in xrange(len(self.__rows)):
-            row = self.__rows[index]
-            row[COLUMN_ID] = index
-            word = row[0].lower()
-            self.__words[word] = row
-        for index in xrange(len(self.__index)):
-            row = self.__index[index]
-            row[COLUMN_SD] = index
+        if self.__words is not None:
+            for row in self.__rows:
+                self.__words[row[0].lower()] = row
+        self.__build_keys()
         return True
 
     # 保存文件
@@ -822,11 +1682,13 @@ class DictCsv (object):
         return True
 
     # 对象解码
-    def __obj_decode (self, row):
+    def __obj_decode (self, row, id = None):
         if row is None:
             return None
         obj = {}
-        obj['id'] = row[COLUMN_ID]
+        if id is None:
+            id = self.__position(row)
+        obj['id'] = id
         obj['sw'] = row[COLUMN_SW]
         skip = self.__numbers
         for key, index in self.__fields:
@@ -862,67 +1724,45 @@ class DictCsv (object):
             row[idx] = value
         return row
 
-    # 重新排序
-    def __resort (self):
-        self.__rows.sort(key = lambda row: row[0].lower())
-        self.__index.sort(key = lambda row: (row[COLUMN_SW], row[0].lower()))
-        for index in xrange(len(self.__rows)):
-            row = self.__rows[index]
-            row[COLUMN_ID] = index
-        for index in xrange(len(self.__index)):
-            row = self.__index[index]
-            row[COLUMN_SD] = index
-        self.__dirty = False
-
     # 查询单词
     def query (self, key):
         if key is None:
             return None
-        if self.__dirty:
-            self.__resort()
         if isinstance(key, int) or isinstance(key, long):
             if key < 0 or key >= len(self.__rows):
                 return None
-            return self.__obj_decode(self.__rows[key])
-        row = self.__words.get(key.lower(), None)
+            return self.__obj_decode(self.__rows[key], key)
+        row = self.__find(key.lower())
         return self.__obj_decode(row)
 
     # 查询单词匹配
     def match (self, word, count = 10, strip = False):
         if len(self.__rows) == 0:
             return []
-        if self.__dirty:
-            self.__resort()
         if not strip:
-            index = self.__rows
-            pos = 0
-        else:
-            index = self.__index
-            pos = COLUMN_SW
-        top = 0
-        bottom = len(index) - 1
-        middle = top
-        key = word.lower()
-        if strip:
-            key = stripword(word)
-        while top < bottom:
-            middle = (top + bottom) >> 1
-            if top == middle or bottom == middle:
-                break
-            text = index[middle][pos].lower()
-            if key == text:
-                break
-            elif key < text:
-                bottom = middle
-            elif key > text:
-                top = middle
-        while index[middle][pos].lower() < key:
-            middle += 1
-            if middle >= len(index):
-                break
-        cc = COLUMN_ID
-        likely = [ (tx[cc], tx[0]) for tx in index[middle:middle + count] ]
-        return likely
+            middle = bisect.bisect_left(self.__keys, word.lower())
+            rows = self.__rows[middle:middle + count]
+            return [ (middle + i, rows[i][0]) for i in xrange(len(rows)) ]
+        middle = bisect.bisect_left(self.__skeys, (stripword(word),))
+        rows = self.__index[middle:middle + count]
+        return [ (self.__position(tx), tx[0]) for tx in rows ]
+
+    # 词频排名，缺失或为 0 时排在最后
+    def __rank (self, row):
+        frq = self.readint(row[self.__names['frq']]) or RANK_NONE
+        bnc = self.readint(row[self.__names['bnc']]) or RANK_NONE
+        return (frq, bnc, row[0].lower())
+
+    # 前缀补全：返回以 prefix 开头的单词，按 frq、bnc 词频排名排序
+    def complete (self, prefix, limit = 10):
+        if not prefix or len(self.__rows) == 0:
+            return []
+        key = prefix.lower()
+        top = bisect.bisect_left(self.__keys, key)
+        bottom = bisect.bisect_left(self.__keys, key + PREFIX_END, top)
+        rows = self.__rows
+        best = heapq.nsmallest(limit, rows[top:bottom], key = self.__rank)
+        return [ (self.__position(row), row[0]) for row in best ]
 
     # 批量查询
     def query_batch (self, keys):
@@ -942,7 +1782,7 @@ class DictCsv (object):
 
     # 是否存在
     def __contains__ (self, key):
-        return self.__words.__contains__(key.lower())
+        return self.__find(key.lower()) is not None
 
     # 迭代器
     def __iter__ (self):
@@ -951,19 +1791,26 @@ class DictCsv (object):
             record.append((index, self.__rows[index][0]))
         return record.__iter__()
 
-    # 注册新单词
+    # 注册新单词：二分定位后插入两个有序数组，无需整体重排
     def register (self, word, items, commit = True):
-        if word.lower() in self.__words:
+        lower = lowerkey(word)
+        if self.__find(lower) is not None:
             return False
         row = self.__obj_encode(items)
         row[0] = word
-        row[COLUMN_ID] = len(self.__rows)
-        row[COLUMN_SD] = len(self.__rows)
+        row[COLUMN_ID] = 0
+        row[COLUMN_SD] = 0
         row[COLUMN_SW] = stripword(word)
-        self.__rows.append(row)
-        self.__index.append(row)
-        self.__words[word.lower()] = row
-        self.__dirty = True
+        row = self.__pack(row)
+        pos = bisect.bisect_left(self.__keys, lower)
+        self.__keys.insert(pos, lower)
+        self.__rows.insert(pos, row)
+        skey = (row[COLUMN_SW], lower)
+        pos = bisect.bisect_left(self.__skeys, skey)
+        self.__skeys.insert(pos, skey)
+        self.__index.insert(pos, row)
+        if self.__words is not None:
+            self.__words[lower] = row
         return True
 
     # 删除单词
@@ -971,23 +1818,19 @@ class DictCsv (object):
         if isinstance(key, int) or isinstance(key, long):
             if key < 0 or key >= len(self.__rows):
                 return False
-            if self.__dirty:
-                self.__resort()
             key = self.__rows[key][0]
-        row = self.__words.get(key, None)
+        lower = key.lower()
+        row = self.__find(lower)
         if row is None:
             return False
-        if len(self.__rows) == 1:
-            self.reset()
-            return True
-        index = row[COLUMN_ID]
-        self.__rows[index] = self.__rows[len(self.__rows) - 1]
-        self.__rows.pop()
-        index = row[COLUMN_SD]
-        self.__index[index] = self.__index[len(self.__rows) - 1]
-        self.__index.pop()
-        del self.__words[key]
-        self.__dirty = True
+        pos = bisect.bisect_left(self.__keys, lower)
+        del self.__keys[pos]
+        del self.__rows[pos]
+        pos = bisect.bisect_left(self.__skeys, (row[COLUMN_SW], lower))
+        del self.__skeys[pos]
+        del self.__index[pos]
+        if self.__words is not None:
+            del self.__words[lower]
         return True
 
     # 清空所有
@@ -1000,19 +1843,29 @@ class DictCsv (object):
         if isinstance(key, int) or isinstance(key, long):
             if key < 0 or key >= len(self.__rows):
                 return False
-            if self.__dirty:
-                self.__resort()
             key = self.__rows[key][0]
         key = key.lower()
-        row = self.__words.get(key, None)
+        row = self.__find(key)
         if row is None:
             return False
         newrow = self.__obj_encode(items)
+        if not self.__compact:
+            for name, idx in self.__fields:
+                if idx == 0:
+                    continue
+                if name in items:
+                    row[idx] = newrow[idx]
+            return True
+        # 紧凑行不可变，整体替换两个有序数组中的引用
+        values = list(row)
         for name, idx in self.__fields:
-            if idx == 0:
-                continue
-            if name in items:
-                row[idx] = newrow[idx]
+            if idx != 0 and name in items:
+                values[idx] = newrow[idx]
+        values = self.__pack(values)
+        pos = bisect.bisect_left(self.__keys, key)
+        self.__rows[pos] = values
+        pos = bisect.bisect_left(self.__skeys, (row[COLUMN_SW], key))
+        self.__index[pos] = values
         return True
 
     # 提交变更
@@ -1026,6 +1879,84 @@ class DictCsv (object):
         return [ n for _, n in self.__iter__() ]
 
 
+#----------------------------------------------------------------------
+# LemmaTable：预编译词根索引中的只读映射
+# names 为排好序的全部字符串，starts/items 记录每个字符串对应的有序结果
+# 在 items 中的区间，查询用二分查找，加载时不需要构建字典
+#----------------------------------------------------------------------
+class LemmaTable (object):
+
+    def __init__ (self, names, starts, items, size):
+        self.__names = names
+        self.__starts = starts
+        self.__items = items
+        self.__size = size
+
+    def __find (self, key):
+        names = self.__names
+        i = bisect.bisect_left(names, key)
+        if i < len(names) and names[i] == key:
+            if self.__starts[i] < self.__starts[i + 1]:
+                return i
+        return -1
+
+    def get (self, key, default = None):
+        i = self.__find(key)
+        if i < 0:
+            return default
+        names = self.__names
+        items = self.__items[self.__starts[i]:self.__starts[i + 1]]
+        return tuple([ names[n] for n in items ])
+
+    def keys (self):
+        names = self.__names
+        starts = self.__starts
+        for i in xrange(len(names)):
+            if starts[i] < starts[i + 1]:
+                yield names[i]
+
+    def items (self):
+        for key in self.keys():
+            yield key, self.get(key)
+
+    def __len__ (self):
+        return self.__size
+
+    def __contains__ (self, key):
+        return self.__find(key) >= 0
+
+    def __getitem__ (self, key):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __iter__ (self):
+        return self.keys()
+
+
+#----------------------------------------------------------------------
+# LemmaRanks：预编译词根索引中的只读词频映射
+#----------------------------------------------------------------------
+class LemmaRanks (object):
+
+    def __init__ (self, names, frqs):
+        self.__names = names
+        self.__frqs = frqs
+
+    def get (self, key, default = None):
+        names = self.__names
+        i = bisect.bisect_left(names, key)
+        if i < len(names) and names[i] == key and self.__frqs[i]:
+            return self.__frqs[i]
+        return default
+
+    def items (self):
+        for name, frq in zip(self.__names, self.__frqs):
+            if frq:
+                yield name, frq
+
+
 #----------------------------------------------------------------------
 # 词形衍生：查找动词的各种时态，名词的复数等，或反向查找
 # 格式为每行一条数据：根词汇 -> 衍生1,衍生2,衍生3
@@ -1034,13 +1965,21 @@ class DictCsv (object):
 #----------------------------------------------------------------------
 class LemmaDB (object):
 
+    # 预编译索引：头部、各数组（uint32）、以换行分隔的 utf-8 字符串表
+    INDEX_MAGIC = b'VXLEM001'
+    INDEX_HEADER = struct.Struct('<8sIIIIII')
+
+    # 紧凑模式下 _stems/_words 的值为排好序的元组，只读；
+    # 修改时再展开为 {word: order} 字典
     def __init__ (self):
         self._stems = {}
         self._words = {}
         self._frqs = {}
+        self._compact = False
 
     # 读取数据
     def load (self, filename, encoding = None):
+        self.__materialize()
         content = open(filename, 'rb').read()
         if content[:3] == b'\xef\xbb\xbf':
             content = content[3:].decode('utf-8', 'ignore')
@@ -1083,6 +2022,98 @@ class LemmaDB (object):
                 if not word:
                     continue
                 self.add(stem, word.strip())
+        self.__freeze()
+        return True
+
+    # 把 {word: order} 字典排序为元组，之后 get 不必每次排序
+    def __ordered (self, table):
+        output = {}
+        for key, items in table.items():
+            if isinstance(items, tuple):
+                output[key] = items
+                continue
+            words = [ (v, k) for (k, v) in items.items() ]
+            words.sort()
+            output[key] = tuple([ intern(k) for (v, k) in words ])
+        return output
+
+    def __freeze (self):
+        if not self._compact:
+            self._stems = self.__ordered(self._stems)
+            self._words = self.__ordered(self._words)
+            self._compact = True
+
+    # 修改前展开为可变结构
+    def __materialize (self):
+        if self._compact:
+            self._stems = self.__expand(self._stems)
+            self._words = self.__expand(self._words)
+            self._frqs = dict(self._frqs.items())
+            self._compact = False
+
+    def __expand (self, table):
+        output = {}
+        for key, items in table.items():
+            output[key] = dict([ (k, i) for (i, k) in enumerate(items) ])
+        return output
+
+    # 保存预编译索引
+    def save_index (self, filename):
+        stems = self.__ordered(self._stems)
+        words = self.__ordered(self._words)
+        names = set(stems)
+        names.update(words)
+        for items in stems.values():
+            names.update(items)
+        names = sorted(names)
+        ids = dict([ (k, i) for (i, k) in enumerate(names) ])
+        arrays = []
+        for table in (stems, words):
+            starts = array.array('I', [0])
+            items = array.array('I')
+            for name in names:
+                for k in table.get(name, ()):
+                    items.append(ids[k])
+                starts.append(len(items))
+            arrays.extend((starts, items))
+        frqs = array.array('I', [ self._frqs.get(k, 0) for k in names ])
+        blob = u'\n'.join(names).encode('utf-8')
+        header = self.INDEX_HEADER.pack(self.INDEX_MAGIC, len(names), 
+                len(stems), len(words), len(arrays[1]), len(arrays[3]), len(blob))
+        with open(filename, 'wb') as fp:
+            fp.write(header)
+            for data in arrays + [frqs]:
+                fp.write(data.tobytes())
+            fp.write(blob)
+        return True
+
+    # 读取预编译索引
+    def load_index (self, filename):
+        with open(filename, 'rb') as fp:
+            content = fp.read()
+        header = self.INDEX_HEADER
+        if len(content) < header.size:
+            raise ValueError('bad lemma index: %s'%filename)
+        magic, count, nstem, nword, nfwd, nrev, nblob = \
+                header.unpack_from(content, 0)
+        if magic != self.INDEX_MAGIC:
+            raise ValueError('bad lemma index: %s'%filename)
+        pos = header.size
+        arrays = []
+        for size in (count + 1, nfwd, count + 1, nrev, count):
+            data = array.array('I')
+            data.frombytes(content[pos:pos + size * 4])
+            arrays.append(data)
+            pos += size * 4
+        names = content[pos:pos + nblob].decode('utf-8')
+        names = count and names.split(u'\n') or []
+        if len(names) != count:
+            raise ValueError('bad lemma index: %s'%filename)
+        fwd_starts, fwd_items, rev_starts, rev_items, frqs = arrays
+        self._stems = LemmaTable(names, fwd_starts, fwd_items, nstem)
+        self._words = LemmaTable(names, rev_starts, rev_items, nword)
+        self._frqs = LemmaRanks(names, frqs)
+        self._compact = True
         return True
 
     # 保存数据文件
@@ -1108,6 +2139,7 @@ class LemmaDB (object):
 
     # 添加一个词根的一个衍生词
     def add (self, stem, word):
+        self.__materialize()
         if stem not in self._stems:
             self._stems[stem] = {}
         if word not in self._stems[stem]:
@@ -1120,6 +2152,7 @@ class LemmaDB (object):
 
     # 删除一个词根的一个衍生词
     def remove (self, stem, word):
+        self.__materialize()
         count = 0
         if stem in self._stems:
             if word in self._stems[stem]:
@@ -1139,6 +2172,8 @@ class LemmaDB (object):
     def reset (self):
         self._stems = {}
         self._words = {}
+        self._frqs = {}
+        self._compact = False
         return True
 
     # 根据词根找衍生，或者根据衍生反向找词根
@@ -1148,13 +2183,16 @@ class LemmaDB (object):
                 if word in self._words:
                     return [word]
                 return None
-            words = [ (v, k) for (k, v) in self._stems[word].items() ]
+            items = self._stems[word]
         else:
             if word not in self._words:
                 if word in self._stems:
                     return [word]
                 return None
-            words = [ (v, k) for (k, v) in self._words[word].items() ]
+            items = self._words[word]
+        if self._compact:
+            return list(items)
+        words = [ (v, k) for (k, v) in items.items() ]
         words.sort()
         return [ k for (v, k) in words ]
 
@@ -1162,6 +2200,25 @@ class LemmaDB (object):
     def word_stem (self, word):
         return self.get(word, reverse = True)
 
+    # 批量还原词根：每个单词取第一个词根，原词找不到时再试小写，都没有则保持原样
+    def lemmatize (self, words):
+        table = self._words
+        compact = self._compact
+        output = []
+        for word in words:
+            items = table.get(word)
+            if items is None:
+                lower = word.lower()
+                items = (lower != word) and table.get(lower) or None
+                if items is None:
+                    output.append((lower in self._stems) and lower or word)
+                    continue
+            if compact:
+                output.append(items[0])
+            else:
+                output.append(min([ (v, k) for (k, v) in items.items() ])[1])
+        return output
+
     # 总共多少条词根数据
     def stem_size (self):
         return len(self._stems)
@@ -1368,11 +2425,11 @@ class DictHelper (object):
                     f1.write(struct.pack('>II', position, len(text)))
                     f2.write(text)
                     position += len(text)
-            with open(mainname + '.ifo', 'wb') as f3:
+            with codecs.open(mainname + '.ifo', 'w', 'utf-8') as f3:
                 f3.write("StarDict's dict ifo file\nversion=2.4.2\n")
                 f3.write('wordcount=%d\n'%len(wordmap))
                 f3.write('idxfilesize=%d\n'%f1.tell())
-                f3.write('bookname=%s\n'%title.encode('utf-8', 'ignore'))
+                f3.write(u'bookname=%s\n'%title)
                 f3.write('author=\ndescription=\n')
                 import datetime
                 ts = datetime.datetime.now().strftime('%Y.%m.%d')
@@ -1754,6 +2811,16 @@ class DictHelper (object):
 #----------------------------------------------------------------------
 tools = DictHelper()
 
+# 把 sqlite 词典文件持久切换为指定的日志模式（服务端使用 WAL），返回切换后的模式
+# 需要可写连接并会修改文件，应在转换、导出等离线步骤中执行，失败时抛出 sqlite3.Error
+def set_journal_mode(filename, mode = 'WAL'):
+    conn = sqlite3.connect(filename)
+    try:
+        return conn.execute('PRAGMA journal_mode = %s;'%mode).fetchone()[0]
+    finally:
+        conn.close()
+
+
 # 根据文件名自动判断数据库类型并打开
 def open_dict(filename):
     if isinstance(filename, dict):
@@ -1765,33 +2832,192 @@ def open_dict(filename):
     return StarDict(filename)
 
 
-# 字典转化，csv sqlite之间互转
-def convert_dict(dstname, srcname):
-    dst = open_dict(dstname)
-    src = open_dict(srcname)
-    dst.delete_all()
-    pc = tools.progress(len(src))
-    for word in src.dumps():
-        pc.next()
-        data = src[word]
-        x = data['oxford']
+# 转换时 oxford/collins 为 0 或空的统一为 None
+def normalize_entry(data):
+    for name in ('oxford', 'collins'):
+        x = data.get(name, None)
         if isinstance(x, int) or isinstance(x, long):
             if x <= 0:
-                data['oxford'] = None
-        elif isinstance(x, str) or isinstance(x, unicode):
-            if x == '' or x == '0':
-                data['oxford'] = None
-        x = data['collins']
-        if isinstance(x, int) or isinstance(x, long):
-            if x <= 0:
-                data['collins'] = None
+                data[name] = None
         elif isinstance(x, str) or isinstance(x, unicode):
             if x in ('', '0'):
-                data['collins'] = None
-        dst.register(word, data, False)
-    dst.commit()
-    pc.done()
-    return True
+                data[name] = None
+    return data
+
+
+# 分块读取 csv 原始行，产出 (列名, 行列表)，列名取自文件首行
+def csv_chunks(filename, codec = 'utf-8', chunk = 10000):
+    with io.open(filename, encoding = codec, newline = '') as fp:
+        reader = csv.reader(fp)
+        heads = next(reader, None)
+        if not heads:
+            return
+        heads = tuple([ n.strip() for n in heads ])
+        rows = []
+        for row in reader:
+            if not row or not row[0]:
+                continue
+            rows.append(row)
+            if len(rows) >= chunk:
+                yield heads, rows
+                rows = []
+        if rows:
+            yield heads, rows
+
+
+# 解码一块原始记录为 (word, data)：kind 为 'sqlite'、'csv' 或 'obj'（已解码的词条）
+# 只依赖参数，可以在子进程中执行
+def decode_chunk(kind, names, rows):
+    output = []
+    if kind == 'csv':
+        helper = DictCsv(None)
+        numbers = ('collins', 'oxford', 'bnc', 'frq')
+        for row in rows:
+            data = {}
+            for name, value in zip(names[1:], row[1:]):
+                if name in numbers:
+                    value = helper.readint(value)
+                elif name == 'detail':
+                    value = value and json.loads(value) or None
+                else:
+                    value = helper.decode(value)
+                data[name] = value
+            output.append((row[0], data))
+    elif kind == 'sqlite':
+        for row in rows:
+            data = dict(zip(names, row))
+            if data.get('detail'):
+                try:
+                    data['detail'] = json.loads(data['detail'])
+                except:
+                    data['detail'] = None
+            output.append((data['word'], data))
+    else:
+        for obj in rows:
+            if obj is not None:
+                output.append((obj['word'], obj))
+    return output
+
+
+# 解码并规范化一块记录（进程池的任务单元）
+def convert_chunk(kind, names, rows):
+    return [ (word, normalize_entry(data)) for word, data in 
+            decode_chunk(kind, names, rows) ]
+
+
+# 按块读取源词典：sqlite 用单个游标，csv 直接流式读文件，其它按单词批量查询
+def source_chunks(srcname, chunk = 10000):
+    if not isinstance(srcname, dict) and srcname[:8] != 'mysql://':
+        ext = os.path.splitext(srcname)[-1].lower()
+        if ext in ('.csv', '.txt'):
+            for names, rows in csv_chunks(srcname, 'utf-8', chunk):
+                yield 'csv', names, rows
+            return
+        src = StarDict(srcname, readonly = True)
+        try:
+            for names, rows in src.records(chunk):
+                yield 'sqlite', names, rows
+        finally:
+            src.close()
+        return
+    src = open_dict(srcname)
+    try:
+        words = src.dumps()
+        for pos in xrange(0, len(words), chunk):
+            yield 'obj', None, src.query_batch(words[pos:pos + chunk])
+    finally:
+        src.close()
+
+
+# 按顺序产出转换好的块；有进程池时最多 depth 块并行处理，避免一次性读入整个源词典
+def convert_chunks(chunks, executor = None, depth = 4):
+    if executor is None:
+        for kind, names, rows in chunks:
+            yield convert_chunk(kind, names, rows)
+        return
+    pending = collections.deque()
+    for kind, names, rows in chunks:
+        pending.append(executor.submit(convert_chunk, kind, names, rows))
+        if len(pending) >= depth:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+# 字典转化，csv sqlite之间互转
+# 源词典分块读取，解码与规范化可交给 workers 个子进程，目标为 sqlite 时批量写入
+# progress 为回调函数，每处理完一块以当前的统计信息调用一次
+# 目标为 sqlite 时先写入同目录下的临时文件（可以安全地关闭同步），完成后整体
+# 替换目标文件，失败时目标保持不变；journal 不为空时在替换前设置日志模式（如 WAL）
+# 返回统计信息：rows 读取条数，written 写入条数，seconds 耗时，rows_per_second 吞吐
+def convert_dict(dstname, srcname, chunk = 10000, workers = 0, progress = None,
+        journal = None):
+    report = {'source': srcname, 'target': dstname, 'chunks': 0, 'rows': 0,
+            'written': 0, 'workers': workers, 'seconds': 0.0, 
+            'rows_per_second': 0.0}
+    ts = time.time()
+    def update():
+        report['seconds'] = time.time() - ts
+        if report['seconds'] > 0:
+            report['rows_per_second'] = report['rows'] / report['seconds']
+    executor = None
+    if workers > 0:
+        import concurrent.futures
+        executor = concurrent.futures.ProcessPoolExecutor(workers)
+    def items():
+        chunks = source_chunks(srcname, chunk)
+        for part in convert_chunks(chunks, executor, workers * 2):
+            report['chunks'] += 1
+            report['rows'] += len(part)
+            update()
+            if progress is not None:
+                progress(dict(report))
+            for item in part:
+                yield item
+    temp = None
+    if not isinstance(dstname, dict) and dstname[:8] != 'mysql://' and \
+            os.path.splitext(dstname)[-1].lower() not in ('.csv', '.txt'):
+        dirname = os.path.dirname(os.path.abspath(dstname))
+        fd, temp = tempfile.mkstemp('.tmp', '.convert-', dirname)
+        os.close(fd)
+    try:
+        dst = open_dict(temp or dstname)
+        try:
+            if temp is not None:
+                written = dst.register_many(items(), replace = False, 
+                        rebuild_index = True, fast = True, chunk = chunk)
+            else:
+                dst.delete_all()
+                written = 0
+                for word, data in items():
+                    if dst.register(word, data, False):
+                        written += 1
+                dst.commit()
+        finally:
+            if hasattr(dst, 'close'):
+                dst.close()
+        if temp is not None:
+            if journal is not None:
+                set_journal_mode(temp, journal)
+            os.replace(temp, dstname)
+            temp = None
+    finally:
+        if temp is not None and os.path.exists(temp):
+            os.remove(temp)
+        if executor is not None:
+            executor.shutdown()
+    report['written'] = written
+    update()
+    return report
+
+
+# 流式读取 csv 词典，逐行产出 (word, data)，不在内存中保留整个文件
+# 列名取自文件首行，数值列转为整数，detail 解析 json，其它列按 DictCsv 规则解码
+# 转换为 sqlite 请使用 convert_dict（同样分块流式读写）
+def csv_stream(filename, codec = 'utf-8'):
+    for names, rows in csv_chunks(filename, codec, 1000):
+        for item in decode_chunk('csv', names, rows):
+            yield item
 
 
 # 从 ~/.local/share/stardict 下面打开词典
@@ -1880,10 +3106,84 @@ if __name__ == '__main__':
         for word in ('gave', 'taken', 'looked', 'teeth', 'speak'):
             print('%s <- %s'%(word, ','.join(lemma.word_stem(word))))
         lemma.save('output.txt')
+        lemma.save_index('lemma.en.idx')
+        t = time.time()
+        lemma = LemmaDB()
+        lemma.load_index('lemma.en.idx')
+        print('load index in %s seconds'%str(time.time() - t))
+        print(lemma.lemmatize(['He', 'gave', 'me', 'two', 'teeth']))
         return 0
     def test5():
         print(tools.validate_word('Hello World', False))
-    test3()
+    def test6():
+        # 批量导入吞吐对比：逐词 register 与 register_many
+        import tempfile
+        size = 50000
+        items = [ ('word%d'%i, {'definition':'definition %d'%i, 
+            'translation':'translation %d'%i, 'frq':i, 'detail':{'n':i}}) 
+            for i in xrange(size) ]
+        tmpdir = tempfile.mkdtemp()
+        def bench(name, load):
+            sd = StarDict(os.path.join(tmpdir, name + '.db'))
+            t = time.time()
+            load(sd)
+            t = time.time() - t
+            print('%-28s %8.3f seconds %10.0f words/s'%(name, t, size / t))
+            assert sd.count() == size
+            sd.close()
+        def single(sd):
+            for word, data in items:
+                sd.register(word, data, False)
+            sd.commit()
+        bench('register', single)
+        bench('register_many', lambda sd: sd.register_many(items))
+        bench('register_many(rebuild,fast)', lambda sd: 
+                sd.register_many(items, rebuild_index = True, fast = True))
+        return 0
+    def test7():
+        # 全文索引：整行替换导入后索引保持一致，中文子串可以反查
+        import tempfile
+        sd = StarDict(os.path.join(tempfile.mkdtemp(), 'fts.db'), fts = True)
+        sd.register_many([('notebook', {'translation': u'n. 笔记本电脑'}),
+            ('computer', {'translation': u'n. 计算机；便携式电脑'}),
+            ('apple', {'translation': u'n. 苹果'})])
+        sd.register_many([('apple', {'translation': u'n. 苹果树'}),
+            ('notebook', {'translation': u'n. 笔记本'})])
+        sd.register_many([('apple', {'translation': u'n. 苹果'})], 
+                rebuild_index = True)
+        conn = sd._StarDict__conn
+        conn.execute("INSERT INTO stardict_fts(stardict_fts) VALUES('integrity-check');")
+        docs = conn.execute('SELECT count(*) FROM stardict_fts_docsize;').fetchone()
+        assert docs[0] == sd.count(), docs
+        words = lambda text: sorted([ n['word'] for n in 
+            sd.search(text, field = 'translation') ])
+        assert words(u'电脑') == ['computer'], words(u'电脑')
+        assert words(u'果') == ['apple'], words(u'果')
+        assert words(u'苹果树') == [], words(u'苹果树')
+        assert words(u'笔记本') == ['notebook'], words(u'笔记本')
+        sd.remove('computer')
+        sd.register('desktop', {'translation': u'n. 台式电脑'})
+        sd.update('notebook', {'translation': u'n. 笔记本；记事本'})
+        conn.execute("INSERT INTO stardict_fts(stardict_fts) VALUES('integrity-check');")
+        assert words(u'电脑') == ['desktop'], words(u'电脑')
+        assert words(u'记事本') == ['notebook'], words(u'记事本')
+        docs = conn.execute('SELECT count(*) FROM stardict_fts_docsize;').fetchone()
+        assert docs[0] == sd.count(), docs
+        conn.commit()
+        # 其它工具（没有注册 Python 函数的连接）可以直接写入词典
+        other = sqlite3.connect(sd._StarDict__path)
+        other.execute("INSERT INTO stardict(word, sw) VALUES('pear', 'pear');")
+        other.commit()
+        other.close()
+        print('fts ok')
+        sd.close()
+        return 0
+    if sys.argv[1:2] == ['bench']:
+        test6()
+    elif sys.argv[1:2] == ['fts']:
+        test7()
+    else:
+        test3()
 
 
 
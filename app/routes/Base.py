@@ -1,4 +1,17 @@
+import os
+import hmac
 from fastapi import APIRouter, Depends, HTTPException, status, Request
+from fastapi.responses import PlainTextResponse
+
+from app.modules.metrics import registry
+
+# 指标接口由采集端访问，不使用用户会话：
+# 请求携带 METRICS_TOKEN（Authorization: Bearer <token>），或来自 METRICS_ALLOW 中的地址
+# METRICS_ALLOW 为逗号分隔的客户端 IP，默认只允许本机，设为空则只认令牌
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+METRICS_ALLOW = {
+    n.strip() for n in os.getenv("METRICS_ALLOW", "127.0.0.1,::1").split(",") if n.strip()
+}
 
 router = APIRouter()
 
@@ -7,4 +20,19 @@ def home(request: Request):
     return {
         "status": "ok",
         "api_version": "0.1.0-dev+local"
-    }
\ No newline at end of file
+    }
+
+def _metrics_allowed(request: Request) -> bool:
+    if METRICS_TOKEN:
+        scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+        if scheme.lower() == "bearer" and hmac.compare_digest(token.encode(), METRICS_TOKEN.encode()):
+            return True
+    return request.client is not None and request.client.host in METRICS_ALLOW
+
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics(request: Request):
+    """Prometheus 指标接口"""
+    if not _metrics_allowed(request):
+        # 未授权时不暴露接口的存在
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,125 @@
+from typing import List, Literal, Optional
+from fastapi import APIRouter, HTTPException, status, Request, Query
+from pydantic import BaseModel, Field
+
+from app.database.modal import UserRoles
+from app.middlewares.verification import RequireRole
+from app.modules.dictionary import DictionaryService
+from utils.logging import logger
+
+router = APIRouter(prefix="/api/dict", tags=["Dictionary"])
+
+# 单次批量查询的最大单词数
+MAX_BATCH_WORDS = 10000
+
+# 整篇文章查询的最大字符数
+MAX_TEXT_LENGTH = 200000
+
+class BatchLookupRequest(BaseModel):
+    words: List[str] = Field(..., min_length=1, max_length=MAX_BATCH_WORDS)
+
+class TextLookupRequest(BaseModel):
+    text: Optional[str] = Field(None, max_length=MAX_TEXT_LENGTH)
+    tokens: Optional[List[str]] = Field(None, max_length=MAX_BATCH_WORDS)
+
+def _get_dictionary(request: Request) -> DictionaryService:
+    dictionary = getattr(request.app.state, "dictionary", None)
+    if dictionary is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Dictionary not loaded"
+        )
+    return dictionary
+
+@router.get("/query")
+@RequireRole(UserRoles.STUDENT)
+async def query_word(request: Request, word: str = Query(..., min_length=1, max_length=64)):
+    """查询单词接口"""
+    entry = await _get_dictionary(request).query(word)
+    if entry is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Word not found"
+        )
+    return entry
+
+@router.get("/match")
+@RequireRole(UserRoles.STUDENT)
+async def match_word(
+    request: Request,
+    word: str = Query(..., min_length=1, max_length=64),
+    limit: int = Query(10, ge=1, le=100),
+    strip: bool = False
+):
+    """单词前缀匹配接口"""
+    matches = await _get_dictionary(request).match(word, limit, strip)
+    return {"matches": [{"id": id, "word": w} for id, w in matches]}
+
+@router.get("/complete")
+@RequireRole(UserRoles.STUDENT)
+async def complete_word(
+    request: Request,
+    prefix: str = Query(..., min_length=1, max_length=64),
+    limit: int = Query(10, ge=1, le=50)
+):
+    """单词自动补全接口（按词频排名）"""
+    completions = await _get_dictionary(request).complete(prefix, limit)
+    return {"completions": [{"id": id, "word": w} for id, w in completions]}
+
+@router.get("/suggest")
+@RequireRole(UserRoles.STUDENT)
+async def suggest_word(
+    request: Request,
+    word: str = Query(..., min_length=1, max_length=64),
+    limit: int = Query(5, ge=1, le=20),
+    max_distance: int = Query(2, ge=0, le=2)
+):
+    """拼写建议接口，按编辑距离与词频排序"""
+    suggestions = await _get_dictionary(request).suggest(word, limit, max_distance)
+    return {"suggestions": [{"word": w, "distance": d} for w, d in suggestions]}
+
+@router.get("/search")
+@RequireRole(UserRoles.STUDENT)
+async def search_text(
+    request: Request,
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(10, ge=1, le=50),
+    field: Literal["all", "translation", "definition"] = "translation"
+):
+    """全文检索接口，默认检索中文翻译（中译英反查）"""
+    dictionary = _get_dictionary(request)
+    if not dictionary.fts:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Full-text index not built"
+        )
+    entries = await dictionary.search(q, limit, None if field == "all" else field)
+    return {"entries": entries}
+
+@router.post("/batch")
+@RequireRole(UserRoles.STUDENT)
+async def batch_lookup(batch: BatchLookupRequest, request: Request):
+    """批量查询单词接口"""
+    entries = await _get_dictionary(request).batch(batch.words)
+    logger.debug("Batch dictionary lookup: %d words", len(batch.words))
+    return {"entries": entries}
+
+@router.post("/lookup_text")
+@RequireRole(UserRoles.STUDENT)
+async def lookup_text(body: TextLookupRequest, request: Request):
+    """整篇文章查询接口：切分单词、还原词形并批量查询，用于把文章导入词汇集"""
+    dictionary = _get_dictionary(request)
+    if body.text is not None:
+        tokens, entries = await dictionary.lookup_text(body.text)
+    elif body.tokens is not None:
+        tokens, entries = await dictionary.lookup_tokens(body.tokens)
+    else:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Either text or tokens is required"
+        )
+    logger.debug("Text dictionary lookup: %d tokens, %d entries", len(tokens), len(entries))
+    return {
+        "tokens": [{"token": token, "lemma": lemma} for token, lemma in tokens],
+        "entries": entries
+    }
@@ -1,13 +1,29 @@
-from fastapi import APIRouter, Request, HTTPException, status
+import hashlib
+from typing import Optional
+from fastapi import APIRouter, Request, Response, HTTPException, status, Query
+from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlmodel import select
 
-from app.database.sql import async_session, get_entities
+from app.database.sql import async_session, read_session
 from app.database.modal import StudyGroup, GroupMember, UserRoles, Account
 from app.middlewares.verification import RequireRole
 from utils.logging import logger
 
 router = APIRouter(prefix="/api/groups", tags=["Study Groups"])
 
+async def _members_etag(session: AsyncSession, group_id: int, after: Optional[int], limit: int) -> str:
+    """
+    由数据库中的成员状态（人数、成员 ID 之和、最近加入时间）生成 ETag，
+    多个工作进程或重启后对同一数据给出相同的 ETag，任一进程写入的成员变动都会改变它
+    """
+    count, total, latest = (await session.execute(
+        select(func.count(), func.sum(GroupMember.user_id), func.max(GroupMember.joined_at))
+        .where(GroupMember.group_id == group_id)
+    )).one()
+    version = hashlib.sha1(f"{count}-{total}-{latest}".encode()).hexdigest()[:16]
+    return f'W/"{group_id}-{version}-{after or 0}-{limit}"'
+
 @router.post("/")
 @RequireRole(UserRoles.TEACHER)
 async def create_group(group_data: dict, request: Request):
@@ -33,32 +49,49 @@ async def create_group(group_data: dict, request: Request):
         session.add(membership)
         await session.commit()
         
-        logger.info(f"New group created by {current_user.username}: {group_data['name']}")
+        logger.info("New group created by %s: %s", current_user.username, group_data["name"])
         return {"message": "Group created successfully", "group_id": new_group.id}
 
 @router.get("/{group_id}/members")
 @RequireRole(UserRoles.TEACHER)
-async def get_group_members(group_id: int):
-    """获取小组成员接口"""
-    async with async_session() as session:
-        members = await get_entities(session, GroupMember, group_id=group_id)
-        if not members:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Group not found or has no members"
-            )
-        
-        member_list = []
-        for member in members:
-            user = await session.get(Account, member.user_id)
-            member_list.append({
-                "user_id": user.id,
-                "username": user.username,
-                "joined_at": member.joined_at
-            })
+async def get_group_members(
+    group_id: int,
+    request: Request,
+    response: Response,
+    after: Optional[int] = None,
+    limit: int = Query(100, ge=1, le=1000)
+):
+    """获取小组成员接口（after 为上一页返回的 next_cursor）"""
+    async with read_session() as session:
+        # 成员未变化时只执行一条聚合查询，直接返回 304
+        etag = await _members_etag(session, group_id, after, limit)
+        if request.headers.get("If-None-Match") == etag:
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
         
-        logger.debug(f"Retrieved members for group ID: {group_id}")
-        return {"members": member_list}
+        # 单条联表查询，只取需要的列
+        stmt = (
+            select(GroupMember.user_id, Account.username, GroupMember.joined_at)
+            .join(Account, Account.id == GroupMember.user_id) #type: ignore
+            .where(GroupMember.group_id == group_id)
+            .order_by(GroupMember.user_id)
+            .limit(limit)
+        )
+        if after is not None:
+            stmt = stmt.where(GroupMember.user_id > after)
+        rows = (await session.execute(stmt)).all()
+    
+    if not rows and after is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Group not found or has no members"
+        )
+    
+    response.headers["ETag"] = etag
+    logger.debug("Retrieved %d members for group ID: %d", len(rows), group_id)
+    return {
+        "members": [{"user_id": r.user_id, "username": r.username, "joined_at": r.joined_at} for r in rows],
+        "next_cursor": rows[-1].user_id if len(rows) == limit else None
+    }
 
 @router.post("/{group_id}/invite")
 @RequireRole(UserRoles.TEACHER)
@@ -74,7 +107,7 @@ async def invite_member(group_id: int, invite_data: dict, request: Request):
             )
         
         # 获取被邀请用户
-        invited_user = await session.execute(select(Account).where(Account.username == invite_data["username"])).scalar_one_or_none()
+        invited_user = (await session.execute(select(Account).where(Account.username == invite_data["username"]))).scalar_one_or_none()
         if not invited_user:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -82,7 +115,7 @@ async def invite_member(group_id: int, invite_data: dict, request: Request):
             )
         
         # 检查是否已经是成员
-        existing_member = await get_entities(session, GroupMember, user_id=invited_user.id, group_id=group_id)
+        existing_member = await session.get(GroupMember, (group_id, invited_user.id))
         if existing_member:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -97,5 +130,5 @@ async def invite_member(group_id: int, invite_data: dict, request: Request):
         session.add(membership)
         await session.commit()
         
-        logger.info(f"User {invited_user.username} invited to group {group_id} by {request.state.user.username}")
+        logger.info("User %s invited to group %s by %s", invited_user.username, group_id, request.state.user.username)
         return {"message": "User invited successfully"}
\ No newline at end of file
@@ -4,7 +4,7 @@ from sqlmodel import select
 from pydantic import BaseModel
 import hashlib
 
-from app.database.sql import async_session, create_entity
+from app.database.sql import async_session, read_session, create_entity
 from app.database.modal import Account, UserRoles
 from app.middlewares.jwt import JWTAuth
 from app.middlewares.verification import RequireRole
@@ -53,6 +53,7 @@ async def login(data: LoginRequest, db: AsyncSession = Depends(get_db)):
     payload = {"user_id": user.id, "role": user.role}
     token = JWTAuth.create_access_token(payload)
     user.jwt = token
+    # 提交后旧令牌的验证缓存由 verification 中的会话事件清除
     await db.commit()
     return {"msg": "Successful", "username": user.username, "user_id": user.id, "role": user.role, "token": token}
 
@@ -60,14 +61,14 @@ async def login(data: LoginRequest, db: AsyncSession = Depends(get_db)):
 @RequireRole(UserRoles.NEW_USER)
 async def get_user(user_id: int):
     """获取用户信息接口"""
-    async with async_session() as session:
+    async with read_session() as session:
         user = await Account.get_by_id(session, user_id)
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="User not found"
             )
-        logger.debug(f"Retrieved user info for ID: {user_id}")
+        logger.debug("Retrieved user info for ID: %s", user_id)
         return {
             "id": user.id,
             "username": user.username,
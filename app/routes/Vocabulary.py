@@ -1,77 +1,231 @@
-from fastapi import APIRouter, HTTPException, status, Request
+import json
+from datetime import datetime
+from typing import Optional, List, Dict
+from fastapi import APIRouter, HTTPException, status, Request, Query
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import select
 
-from app.database.sql import async_session, get_entities
-from app.database.modal import Vocabulary, LearningProgress, UserRoles
+from app.database.sql import async_session, read_session, get_columns_after, begin_write, SQLITE_MAX_VARIABLE
+from app.database.modal import Vocabulary, LearningProgress, UserRoles, MasteryLevel
 from app.middlewares.verification import RequireRole
+from app.modules.learning_stats import get_stats, update_counters
+from app.modules.scheduler import schedule_review, to_utc_naive, utcnow
 from utils.logging import logger
 
 router = APIRouter(prefix="/api/vocab", tags=["Vocabulary Learning"])
 
+# 单次批量提交的最大条目数，写入与查询按 SQLite 变量上限分块执行
+MAX_BATCH_SIZE = 500
+# 每条进度写入 5 个绑定参数
+PROGRESS_COLUMNS = 5
+
+class ProgressEntry(BaseModel):
+    vocab_id: int
+    mastery_level: MasteryLevel
+    reviewed_at: Optional[datetime] = None
+
+class BatchProgressRequest(BaseModel):
+    items: List[ProgressEntry] = Field(..., min_length=1, max_length=MAX_BATCH_SIZE)
+
+# 流式输出时每页读取的词汇数量
+STREAM_PAGE_SIZE = 1000
+
+def _vocab_columns():
+    return (Vocabulary.id, Vocabulary.word, Vocabulary.category)
+
+async def _stream_vocabulary(after: Optional[int]):
+    """按主键游标逐页读取词汇，逐行输出 NDJSON"""
+    while True:
+        # 每页使用独立会话，避免整个流式响应期间一直持有读事务
+        async with read_session() as session:
+            rows = await get_columns_after(session, Vocabulary, _vocab_columns(), after, STREAM_PAGE_SIZE)
+        if not rows:
+            break
+        yield "".join(json.dumps({"id": r.id, "word": r.word, "category": r.category}, ensure_ascii=False) + "\n" for r in rows)
+        if len(rows) < STREAM_PAGE_SIZE:
+            break
+        after = rows[-1].id
+
 @router.get("/sets")
 @RequireRole(UserRoles.STUDENT)
-async def get_vocabulary_sets():
-    """获取词汇集合接口"""
-    async with async_session() as session:
-        vocab_sets = await get_entities(session, Vocabulary)
-        
-        logger.debug(f"Retrieved {len(vocab_sets)} vocabulary sets")
-        return {"sets": [{"id": v.id, "word": v.word, "category": v.category} for v in vocab_sets]}
+async def get_vocabulary_sets(
+    request: Request,
+    after: Optional[int] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    stream: bool = False
+):
+    """获取词汇集合接口（after 为上一页返回的 next_cursor，stream=true 时以 NDJSON 流式返回全部后续词汇）"""
+    if stream:
+        return StreamingResponse(_stream_vocabulary(after), media_type="application/x-ndjson")
+    async with read_session() as session:
+        rows = await get_columns_after(session, Vocabulary, _vocab_columns(), after, limit)
+
+    logger.debug("Retrieved %d vocabulary sets", len(rows))
+    return {
+        "sets": [{"id": r.id, "word": r.word, "category": r.category} for r in rows],
+        "next_cursor": rows[-1].id if len(rows) == limit else None
+    }
+
+async def _upsert_progress(session: AsyncSession, user_id: int, entries: List[ProgressEntry]) -> Dict[int, str]:
+    """
+    在一个事务中写入多条学习进度，返回每个词汇 ID 的处理结果
+
+    词汇存在性与已有进度用 IN 查询取得，写入使用 INSERT ... ON CONFLICT DO UPDATE，
+    均按 SQLITE_MAX_VARIABLE 分块，不超过旧版 SQLite 的绑定变量上限；
+    先取得写锁再读取已有进度，统计计数的增量基于事务内的旧值
+    """
+    await begin_write(session)
+    # 同一词汇多次提交时以最后一条为准
+    latest = {entry.vocab_id: entry for entry in entries}
+    vocab_ids = list(latest)
+    
+    # IN 查询还有一个 user_id 参数
+    size = SQLITE_MAX_VARIABLE - 1
+    found = set()
+    for pos in range(0, len(vocab_ids), size):
+        found.update((await session.execute(
+            select(Vocabulary.id).where(Vocabulary.id.in_(vocab_ids[pos:pos + size])) #type: ignore
+        )).scalars())
+    found_ids = [vocab_id for vocab_id in vocab_ids if vocab_id in found]
+    existing = {}
+    for pos in range(0, len(found_ids), size):
+        for row in (await session.execute(
+            select(
+                LearningProgress.vocab_id,
+                LearningProgress.mastery_level,
+                LearningProgress.last_reviewed,
+                LearningProgress.next_review
+            ).where(LearningProgress.user_id == user_id, LearningProgress.vocab_id.in_(found_ids[pos:pos + size])) #type: ignore
+        )).all():
+            existing[row.vocab_id] = row
+    
+    results = {}
+    rows = []
+    changes = []
+    now = utcnow()
+    for vocab_id in vocab_ids:
+        if vocab_id not in found:
+            results[vocab_id] = "not_found"
+            continue
+        entry = latest[vocab_id]
+        previous = existing.get(vocab_id)
+        reviewed_at = to_utc_naive(entry.reviewed_at) if entry.reviewed_at else now
+        rows.append({
+            "user_id": user_id,
+            "vocab_id": vocab_id,
+            "mastery_level": entry.mastery_level,
+            "last_reviewed": reviewed_at,
+            # SM-2 间隔调度，上一次间隔由已有的 last_reviewed / next_review 推出
+            "next_review": schedule_review(
+                entry.mastery_level,
+                reviewed_at,
+                previous.last_reviewed if previous else None,
+                previous.next_review if previous else None
+            )
+        })
+        changes.append((previous.mastery_level if previous else None, entry.mastery_level))
+        results[vocab_id] = "updated" if vocab_id in existing else "created"
+    
+    if rows:
+        size = SQLITE_MAX_VARIABLE // PROGRESS_COLUMNS
+        for pos in range(0, len(rows), size):
+            stmt = sqlite_insert(LearningProgress).values(rows[pos:pos + size])
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[LearningProgress.user_id, LearningProgress.vocab_id],
+                set_={
+                    "mastery_level": stmt.excluded.mastery_level,
+                    "last_reviewed": stmt.excluded.last_reviewed,
+                    "next_review": stmt.excluded.next_review
+                }
+            )
+            await session.execute(stmt)
+        # 同一事务内增量更新统计计数
+        await update_counters(session, user_id, changes)
+    await session.commit()
+    return results
 
 @router.post("/progress")
 @RequireRole(UserRoles.STUDENT)
-async def record_progress(progress_data: dict, request: Request):
+async def record_progress(progress_data: ProgressEntry, request: Request):
     """记录学习进度接口"""
     async with async_session() as session:
         # 获取当前用户
         current_user = request.state.user
         
-        # 检查词汇是否存在
-        vocab = await session.get(Vocabulary, progress_data["vocab_id"])
-        if not vocab:
+        results = await _upsert_progress(session, current_user.id, [progress_data])
+        if results[progress_data.vocab_id] == "not_found":
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Vocabulary not found"
             )
         
-        # 更新或创建学习进度
-        progress = await get_entities(session, LearningProgress, user_id=current_user.id, vocab_id=vocab.id)
-        
-        if progress:
-            progress.mastery_level = progress_data["mastery_level"]
-        else:
-            progress = LearningProgress(
-                user_id=current_user.id,
-                vocab_id=vocab.id,
-                mastery_level=progress_data["mastery_level"]
-            )
-            session.add(progress)
+        logger.info("Progress recorded for user %s on vocab %d", current_user.username, progress_data.vocab_id)
+        return {"message": "Progress recorded successfully"}
+
+@router.post("/progress/batch")
+@RequireRole(UserRoles.STUDENT)
+async def record_progress_batch(batch: BatchProgressRequest, request: Request):
+    """批量记录学习进度接口"""
+    async with async_session() as session:
+        # 获取当前用户
+        current_user = request.state.user
         
-        await session.commit()
+        results = await _upsert_progress(session, current_user.id, batch.items)
         
-        logger.info(f"Progress recorded for user {current_user.username} on vocab {vocab.word}")
-        return {"message": "Progress recorded successfully"}
+        logger.info("Batch progress recorded for user %s: %d items", current_user.username, len(results))
+        return {"results": [{"vocab_id": vocab_id, "status": result} for vocab_id, result in results.items()]}
 
 @router.get("/stats")
 @RequireRole(UserRoles.STUDENT)
 async def get_learning_stats(request: Request):
     """获取学习统计接口"""
-    async with async_session() as session:
+    async with read_session() as session:
         # 获取当前用户
         current_user = request.state.user
         
-        # 获取用户的所有学习进度
-        progresses = await get_entities(session, LearningProgress, user_id=current_user.id)
+        # 统计由计数表或单条聚合查询得出，无需加载全部学习进度
+        stats = await get_stats(session, current_user.id)
         
-        # 计算统计数据
-        total_vocab = len(progresses)
-        mastered_vocab = len([p for p in progresses if p.mastery_level >= 8])
-        practicing_vocab = len([p for p in progresses if 4 <= p.mastery_level < 8])
-        new_vocab = len([p for p in progresses if p.mastery_level < 4])
+        logger.debug("Retrieved learning stats for user %s", current_user.username)
+        return stats
+
+@router.get("/due")
+@RequireRole(UserRoles.STUDENT)
+async def get_due_vocabulary(request: Request, limit: int = Query(20, ge=1, le=200)):
+    """获取待复习词汇接口"""
+    async with read_session() as session:
+        # 获取当前用户
+        current_user = request.state.user
+        
+        # 在 (user_id, next_review) 索引上做范围扫描，按到期先后返回
+        stmt = (
+            select(
+                LearningProgress.vocab_id,
+                Vocabulary.word,
+                Vocabulary.category,
+                LearningProgress.mastery_level,
+                LearningProgress.next_review
+            )
+            .join(Vocabulary, Vocabulary.id == LearningProgress.vocab_id) #type: ignore
+            .where(LearningProgress.user_id == current_user.id, LearningProgress.next_review <= utcnow()) #type: ignore
+            .order_by(LearningProgress.next_review)
+            .limit(limit)
+        )
+        rows = (await session.execute(stmt)).all()
         
-        logger.debug(f"Retrieved learning stats for user {current_user.username}")
+        logger.debug("Retrieved %d due words for user %s", len(rows), current_user.username)
         return {
-            "total_vocab": total_vocab,
-            "mastered_vocab": mastered_vocab,
-            "practicing_vocab": practicing_vocab,
-            "new_vocab": new_vocab
-        }
\ No newline at end of file
+            "due": [
+                {
+                    "vocab_id": r.vocab_id,
+                    "word": r.word,
+                    "category": r.category,
+                    "mastery_level": r.mastery_level,
+                    "next_review": r.next_review
+                }
+                for r in rows
+            ]
+        }
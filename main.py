@@ -2,8 +2,12 @@ import os
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
+from anyio.to_thread import run_sync
 from app.database.sql import init_db
-from app.routes import Base, User
+from app.database.instrumentation import log_summary
+from app.routes import Base, User, Group, Vocabulary, Dictionary
+from app.modules.dictionary import DictionaryService
+from app.middlewares.timing import TimingMiddleware
 from utils.logging import LoggerFactory
 
 # Logger
@@ -15,10 +19,19 @@ async def lifespan(app: FastAPI):
     logger.info("初始化 SQLite 数据库")
     await init_db()
     logger.info("SQLite 数据库初始化完成")
+    # 词典只加载一次，所有请求共享只读连接池；加载索引较慢，放到工作线程中执行
+    app.state.dictionary = await run_sync(DictionaryService.open)
     yield
+    if app.state.dictionary is not None:
+        app.state.dictionary.close()
+    # 退出时输出耗时最多的 SQL 汇总
+    log_summary()
 
 app = FastAPI(title="voXplore Server", lifespan=lifespan)
 
+# 请求计时与数据库查询计数，结构化 JSON 日志
+app.add_middleware(TimingMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://127.20.0.1:5173"],
@@ -29,3 +42,6 @@ app.add_middleware(
 
 app.include_router(Base.router)
 app.include_router(User.router)
+app.include_router(Group.router)
+app.include_router(Vocabulary.router)
+app.include_router(Dictionary.router)
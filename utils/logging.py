@@ -1,36 +1,89 @@
-import logging
+import os
 import sys
-from logging.handlers import RotatingFileHandler
+import queue
+import atexit
+import logging
+import threading
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
 from pathlib import Path
+from typing import Optional, Dict
+
+# 异步日志：处理器在后台线程中执行，调用方只把日志记录放入有界队列
+LOG_ASYNC = os.getenv("LOG_ASYNC", "1") != "0"
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# 队列满时的策略：drop 直接丢弃并计数，block 等待最多 LOG_QUEUE_TIMEOUT 秒后再丢弃
+LOG_QUEUE_POLICY = os.getenv("LOG_QUEUE_POLICY", "drop")
+LOG_QUEUE_TIMEOUT = float(os.getenv("LOG_QUEUE_TIMEOUT", "0.1"))
+
+# 默认的文本日志格式；访问日志每行只输出消息本身（JSON）
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+ACCESS_LOG_FORMAT = '%(message)s'
+
+class BoundedQueueHandler(QueueHandler):
+    """
+    有界队列处理器，队列满时按策略丢弃日志并统计丢弃数量
+    """
+
+    def __init__(self, log_queue: "queue.Queue", policy: str = LOG_QUEUE_POLICY, timeout: float = LOG_QUEUE_TIMEOUT):
+        super().__init__(log_queue)
+        self.policy = policy
+        self.timeout = timeout
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            if self.policy == "block":
+                self.queue.put(record, timeout=self.timeout)
+            else:
+                self.queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
 
 class LoggerFactory:
     """
     日志组件，支持同时输出到文件和终端
     """
     
-    def __init__(self, name: str, log_dir: str = "logs", log_level: int = logging.INFO):
+    def __init__(
+        self,
+        name: str,
+        log_dir: str = "logs",
+        log_level: int = logging.INFO,
+        async_mode: Optional[bool] = None,
+        queue_size: int = LOG_QUEUE_SIZE,
+        policy: str = LOG_QUEUE_POLICY,
+        filename: str = "server.log",
+        fmt: str = LOG_FORMAT,
+        propagate: bool = True
+    ):
         """
         初始化日志组件
         
         :param name: 日志名称
         :param log_dir: 日志目录，默认为项目根目录下的logs文件夹
         :param log_level: 日志级别，默认为INFO
+        :param async_mode: 是否在后台线程写日志，默认读取 LOG_ASYNC 环境变量
+        :param queue_size: 异步模式下的队列长度
+        :param policy: 队列满时的策略，drop 或 block
+        :param filename: 日志目录下的日志文件名
+        :param fmt: 日志格式
+        :param propagate: 是否同时交给上级日志（如 app.access 的上级 app）处理
         """
         self.logger = logging.getLogger(name)
         self.logger.setLevel(log_level)
+        self.logger.propagate = propagate
         
         # 确保日志目录存在
         Path(log_dir).mkdir(parents=True, exist_ok=True)
         
         # 日志格式
-        formatter = logging.Formatter(
-            '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-            datefmt='%Y-%m-%d %H:%M:%S'
-        )
+        formatter = logging.Formatter(fmt, datefmt='%Y-%m-%d %H:%M:%S')
         
         # 文件日志处理器 - 按大小滚动，最多保留5个文件，每个文件最大 128 MB
         file_handler = RotatingFileHandler(
-            filename=f"{log_dir}/server.log",
+            filename=f"{log_dir}/{filename}",
             maxBytes=128*1024*1024,  # 128 MB
             backupCount=5,
             encoding="utf-8"
@@ -41,13 +94,40 @@ class LoggerFactory:
         console_handler = logging.StreamHandler(sys.stdout)
         console_handler.setFormatter(formatter)
         
-        # 添加处理器
-        self.logger.addHandler(file_handler)
-        self.logger.addHandler(console_handler)
+        # 添加处理器：异步模式下由后台线程的 QueueListener 调用文件与终端处理器
+        self.queue_handler: Optional[BoundedQueueHandler] = None
+        self.listener: Optional[QueueListener] = None
+        if LOG_ASYNC if async_mode is None else async_mode:
+            log_queue: "queue.Queue" = queue.Queue(queue_size)
+            self.queue_handler = BoundedQueueHandler(log_queue, policy)
+            self.listener = QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+            self.listener.start()
+            self.logger.addHandler(self.queue_handler)
+            # 退出时把队列中剩余的日志写完
+            atexit.register(self.stop)
+        else:
+            self.logger.addHandler(file_handler)
+            self.logger.addHandler(console_handler)
 
         # 清空日志文件
-        open(f"{log_dir}/server.log", 'w').close()
+        open(f"{log_dir}/{filename}", 'w').close()
     
+    def stop(self):
+        """停止后台线程，写完队列中剩余的日志"""
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+
+    def stats(self) -> Dict[str, int]:
+        """异步队列的统计信息：当前排队数、容量与丢弃数"""
+        if self.queue_handler is None:
+            return {"queued": 0, "capacity": 0, "dropped": 0}
+        return {
+            "queued": self.queue_handler.queue.qsize(),
+            "capacity": self.queue_handler.queue.maxsize,
+            "dropped": self.queue_handler.dropped
+        }
+
     def debug(self, msg: str, *args, **kwargs):
         """记录调试信息"""
         self.logger.debug(msg, *args, **kwargs)
@@ -73,4 +153,47 @@ class LoggerFactory:
         self.logger.exception(msg, *args, **kwargs)
 
 # 全局日志实例
-logger = LoggerFactory("app")
\ No newline at end of file
+logger = LoggerFactory("app")
+# 访问日志：每个请求一行 JSON，写入 access.log，不经过 app 的文本格式
+access_logger = LoggerFactory("app.access", filename="access.log", fmt=ACCESS_LOG_FORMAT, propagate=False)
+
+if __name__ == "__main__":
+    # 日志对请求延迟的影响：python -m utils.logging [请求数]
+    import time
+    import tempfile
+    import statistics
+
+    def bench(async_mode: bool, count: int) -> Dict[str, float]:
+        log_dir = tempfile.mkdtemp()
+        factory = LoggerFactory(f"bench-{async_mode}", log_dir, async_mode=async_mode, queue_size=count)
+        # 终端输出重定向到空设备，只保留真实的写入开销
+        stdout = sys.stdout
+        sys.stdout = open(os.devnull, "w")
+        for handler in factory.listener.handlers if factory.listener else factory.logger.handlers:
+            if isinstance(handler, logging.StreamHandler) and not isinstance(handler, logging.FileHandler):
+                handler.setStream(sys.stdout)
+        samples = []
+        try:
+            for i in range(count):
+                t = time.perf_counter()
+                factory.info("User %d updated progress for vocabulary %d", i, i * 7)
+                samples.append((time.perf_counter() - t) * 1e6)
+            drain = time.perf_counter()
+            factory.stop()
+            drain = time.perf_counter() - drain
+        finally:
+            sys.stdout.close()
+            sys.stdout = stdout
+        samples.sort()
+        return {
+            "mean_us": statistics.mean(samples),
+            "p50_us": samples[len(samples) // 2],
+            "p99_us": samples[int(len(samples) * 0.99)],
+            "drain_s": drain,
+            "dropped": factory.stats()["dropped"]
+        }
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    for mode in (False, True):
+        result = bench(mode, count)
+        print(("async" if mode else "sync ") + "  " + "  ".join(f"{k}={v:.2f}" for k, v in result.items()))